@@ -1,13 +1,35 @@
-import time
 import os
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
-import requests
+from canvas_client import CanvasClient
+from grade_batch import GradeBatch
+from grading_executor import GradingExecutor
+from grading_ledger import GradingLedger
+from grading_scripts import grade_cache
+from metrics import METRICS, MetricsServer, format_stage_summary
+from pipeline import AssignmentPipeline
+from scheduler import Scheduler, TriggerServer
+from submission_store import SubmissionCursorStore
 
 # Load environment variables
 load_dotenv()
 API_TOKEN = os.getenv('API_TOKEN')
-CANVAS_URL = 'https://bcourses.berkeley.edu/api/v1/'
+CANVAS_URL = os.getenv('CANVAS_URL', 'https://bcourses.berkeley.edu/api/v1/')
 COURSE_ID = 1531586 # Spr24 BioE 140L canvas course number
+INCREMENTAL_FETCH = os.getenv('INCREMENTAL_FETCH', 'true').lower() == 'true'  # Only fetch submissions changed since the last pass
+CURSOR_STORE_PATH = os.getenv('CURSOR_STORE_PATH', 'submission_cursors.json')  # Where the per-assignment fetch cursors are kept
+LEDGER_PATH = os.getenv('LEDGER_PATH', 'grading_ledger.sqlite3')  # Record of posted and failed grades
+CANVAS_WORKERS = int(os.getenv('CANVAS_WORKERS', '8'))  # Concurrent connections to Canvas
+GRADER_WORKERS = int(os.getenv('GRADER_WORKERS', '0')) or None  # Grading processes (defaults to one per CPU core)
+GRADE_TIMEOUT = int(os.getenv('GRADE_TIMEOUT', '120'))  # Seconds one submission may take to grade
+GRADER_MEMORY_LIMIT_MB = int(os.getenv('GRADER_MEMORY_LIMIT_MB', '0'))  # Memory one submission may allocate while grading (0 for no limit)
+GRADER_CPU_LIMIT = int(os.getenv('GRADER_CPU_LIMIT', '0'))  # CPU seconds one submission may use (0 for no limit)
+TRIGGER_PORT = int(os.getenv('TRIGGER_PORT', '0'))  # Local port accepting POST /trigger[/<assignment_id>] (0 disables)
+PIPELINE_DEPTH = int(os.getenv('PIPELINE_DEPTH', '4'))  # Pages fetched ahead of grading, per assignment
+METRICS_PORT = int(os.getenv('METRICS_PORT', '0'))  # Local port serving GET /metrics and /metrics.json (0 disables)
+METRICS_PATH = os.getenv('METRICS_PATH', '')  # File rewritten with the metrics after every pass (.prom for Prometheus text, else JSON)
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'DEBUG').upper()  # INFO skips building the per-submission debug messages
+BULK_GRADE_CHUNK_SIZE = int(os.getenv('BULK_GRADE_CHUNK_SIZE', '50'))  # Students per update_grades request (0 posts one at a time)
 ASSIGNMENTS = [
     {
         'id': 8685248,                         # Assignment ID
@@ -21,85 +43,26 @@ ASSIGNMENTS = [
     #     'name': 'Another Assignment Name',    # Another Assignment Name
     #     'grader': 'another_grader_function'   # Corresponding Grader Function
     # }
+    # or, graded from a spec in grading_scripts/rubrics/ instead of a Python module:
+    #     'grader': 'rubric:another_assignment'
 ]
 
-headers = {'Authorization': f'Bearer {API_TOKEN}'}
+
+canvas = CanvasClient(CANVAS_URL, API_TOKEN, max_workers=CANVAS_WORKERS)
 
 def get_assignments(course_id):
-    response = requests.get(f"{CANVAS_URL}courses/{course_id}/assignments", headers=headers)
-    if response.status_code == 200:
-        return response.json()
-    else:
-        print("Failed to retrieve assignments, status code:", response.status_code)
+    assignments = canvas.get_assignments(course_id)
+    if assignments is None:
+        logging.error("Failed to retrieve assignments.")
         return []  # Return an empty list in case of failure
+    return assignments
 
-def get_submissions(assignment_id):
-    submissions = []
-    page = 1
-    while True:
-        response = requests.get(
-            f"{CANVAS_URL}courses/{COURSE_ID}/assignments/{assignment_id}/submissions?page={page}",
-            headers=headers
-        )
-        if response.status_code == 200:
-            data = response.json()
-            submissions.extend(data)
-            if not data:  # No more data, break the loop
-                break
-            page += 1
-        else:
-            logging.error(f"Failed to retrieve submissions for assignment {assignment_id}, page {page}, status code: {response.status_code}")
-            break
-    return submissions
-
-
-import importlib
-import requests
-from urllib.parse import urljoin, urlparse, parse_qs
-
-def get_submissions(assignment_id):
-    submissions = []
-    url = f"{CANVAS_URL}courses/{COURSE_ID}/assignments/{assignment_id}/submissions"
-    
-    while url:
-        response = requests.get(url, headers=headers)
-        if response.status_code == 200:
-            submissions.extend(response.json())
-
-            # Parsing the Link header for pagination
-            link_header = response.headers.get('Link', None)
-            if link_header:
-                links = {rel.split(';')[1].strip().replace('rel="', '').replace('"', ''): urljoin(url, rel.split(';')[0].strip().replace('<', '').replace('>', '')) for rel in link_header.split(',')}
-                url = links.get('next', None)
-            else:
-                url = None
-        else:
-            logging.error(f"Failed to retrieve submissions for assignment {assignment_id}, status code: {response.status_code}")
-            break
-
-    return submissions
-
-def update_submission(course_id, assignment_id, user_id, score, comments, gradeable=True):
-    combined_comment = '\n'.join(comments)  # Joins all comments with a newline character between them
-
-    try:
-        payload = {
-            'submission': {'posted_grade': score},
-            'comment': {'text_comment': combined_comment}
-        }
-        response = requests.put(
-            f"{CANVAS_URL}courses/{course_id}/assignments/{assignment_id}/submissions/{user_id}",
-            headers=headers, json=payload
-        )
-        if response.status_code == 200:
-            logging.debug(f"Successfully updated submission for user {user_id}")
-            return True
-        else:
-            logging.error(f"Failed to update submission for user {user_id}, status code: {response.status_code}, response: {response.text}")
-            return False
-    except Exception as e:
-        logging.error(f"Exception occurred while updating submission for user {user_id}: {e}")
-        return False
+def update_submissions(course_id, assignment_id, grades):
+    # Posts (user_id, score, comments) tuples in bulk chunks; returns {user_id: success}
+    batch = GradeBatch(canvas, course_id, assignment_id, chunk_size=BULK_GRADE_CHUNK_SIZE)
+    for user_id, score, comments in grades:
+        batch.add(user_id, score, comments)
+    return batch.post()
 
 # ... [rest of your code before the main function] ...
 
@@ -107,50 +70,119 @@ from grading_scripts import grade_design1  # Import all grading scripts
 
 # Configure logging
 import logging
-logging.basicConfig(filename='autograder.log', level=logging.DEBUG, 
+logging.basicConfig(filename='autograder.log', level=LOG_LEVEL, 
                     format='%(asctime)s:%(levelname)s:%(message)s')
 
+def submission_pages(assignment, store):
+    # Pages of submissions to look at this cycle, downloaded while earlier pages are graded
+    assignment_id = assignment['id']
+    if store:
+        return canvas.iter_new_submission_pages(COURSE_ID, assignment_id, store.get_since(assignment_id), prefetch=PIPELINE_DEPTH)
+    return canvas.iter_submission_pages(COURSE_ID, assignment_id, prefetch=PIPELINE_DEPTH)
+
+def retry_failed_posts(assignment, ledger):
+    # Failed posts from earlier cycles are retried without regrading
+    assignment_id = assignment['id']
+    retries = ledger.due_retries(assignment_id)
+    if not retries:
+        return
+    logging.info(f"Retrying {len(retries)} failed grade posts for assignment {assignment['name']}.")
+    results = update_submissions(
+        COURSE_ID, assignment_id,
+        [(user_id, score, comments) for user_id, _, _, score, comments in retries]
+    )
+    ledger.record_retries(assignment_id, [
+        (user_id, attempt, digest, bool(results.get(user_id)))
+        for user_id, attempt, digest, _, _ in retries
+    ])
+
+def process_assignment(assignment, store, ledger, executor):
+    # Streams one assignment's submissions through fetch -> grade -> post; returns how many were graded
+    assignment_name = assignment['name']
+    logging.info(f"Processing assignment: {assignment_name} (ID: {assignment['id']})")
+    retry_failed_posts(assignment, ledger)
+
+    pipeline = AssignmentPipeline(
+        assignment, submission_pages(assignment, store), store, ledger, executor,
+        lambda grades: update_submissions(COURSE_ID, assignment['id'], grades),
+        depth=PIPELINE_DEPTH, chunk_size=BULK_GRADE_CHUNK_SIZE
+    )
+    graded = pipeline.run()
+    if not graded and not pipeline.fetch_failed:
+        logging.info(f"No new submissions for assignment {assignment_name}. Continuing to next assignment.")
+    return graded
+
+def run_assignment(assignment, store, ledger, executor):
+    # Processes a single assignment; used by the scheduler
+    cache_before = grade_cache.stats()
+    stages_before = METRICS.stage_totals()
+    graded = process_assignment(assignment, store, ledger, executor)
+    log_cache_hit_rate(cache_before, f"for {assignment['name']}")
+    log_stage_timings(stages_before, f"for {assignment['name']}")
+    return graded
+
+def log_cache_hit_rate(before, scope):
+    hits, misses = grade_cache.stats()
+    hits, misses = hits - before[0], misses - before[1]
+    if hits + misses:
+        logging.info(f"Grade cache hit rate {scope}: {hits / (hits + misses):.0%} ({hits} of {hits + misses} submissions).")
+
+def log_stage_timings(before, scope):
+    # Stages running in other passes at the same time are included too
+    summary = format_stage_summary(before, METRICS.stage_totals())
+    if summary:
+        logging.info(f"Stage timings {scope}: {summary}")
+    if METRICS_PATH:
+        try:
+            METRICS.write(METRICS_PATH)
+        except OSError as e:
+            logging.error(f"Could not write metrics to {METRICS_PATH}: {e}")
+
+def get_assignment_info(assignment):
+    return canvas.get_assignment(COURSE_ID, assignment['id'])
+
+def setup():
+    # Opens the local state and starts the grading workers; returns (store, ledger, executor)
+    store = SubmissionCursorStore(CURSOR_STORE_PATH) if INCREMENTAL_FETCH else None
+    ledger = GradingLedger(LEDGER_PATH)
+    executor = GradingExecutor(
+        [assignment['grader'] for assignment in ASSIGNMENTS],
+        max_workers=GRADER_WORKERS, timeout=GRADE_TIMEOUT,
+        memory_limit=GRADER_MEMORY_LIMIT_MB * 1024 * 1024, cpu_limit=GRADER_CPU_LIMIT
+    )
+    return store, ledger, executor
+
 def main():
-    while True:
-        logging.info("Starting processing of assignments.")
-        for assignment in ASSIGNMENTS:
-            assignment_id = assignment['id']
-            assignment_name = assignment['name']
-            logging.info(f"Processing assignment: {assignment_name} (ID: {assignment_id})")
-
-            try:
-                submissions = get_submissions(assignment_id)
-                if not submissions:
-                    logging.warning(f"No submissions found for assignment {assignment_name}. Continuing to next assignment.")
-                    continue
-
-                grader_function = getattr(importlib.import_module(f'grading_scripts.{assignment["grader"]}'), 'grade')
-                for submission in submissions:
-                    user_id = submission['user_id']
-                    submission_state = submission['workflow_state']  # Define submission_state here
-                    logging.debug(f"Submission from user {user_id} is in '{submission_state}' state.")
-                    
-                    if submission_state != 'submitted':
-                        logging.debug(f"Skipping non-submitted submission from user {user_id} in state '{submission_state}'.")
-                        continue
-
-                    logging.info(f"Grading submission from user {user_id} for assignment {assignment_name}.")
-                    score, comment = grader_function(submission)
-                    if score < 0:
-                        logging.warning(f"Submission from user {user_id} cannot be graded. Comment: {comment}")
-                        continue
-
-                    logging.info(f"Updating submission for user {user_id} with score {score} and comment: {comment}")
-                    update_successful = update_submission(COURSE_ID, assignment_id, user_id, score, comment, True)
-                    if not update_successful:
-                        logging.error(f"Failed to update submission for user {user_id}.")
-            
-            except Exception as e:
-                logging.critical(f"Unexpected error while processing assignment {assignment_name}: {e}")
-                continue
-
-        logging.info("Completed processing all specified assignments. Waiting for 5 minutes before next iteration.")
-        time.sleep(300)
+    store, ledger, executor = setup()
+    scheduler = Scheduler(
+        ASSIGNMENTS,
+        lambda assignment: run_assignment(assignment, store, ledger, executor),
+        get_assignment_info
+    )
+    if TRIGGER_PORT:
+        TriggerServer(scheduler, TRIGGER_PORT).start()
+    if METRICS_PORT:
+        MetricsServer(METRICS, METRICS_PORT).start()
+    scheduler.run_forever()
+
+def run_cycle(store, ledger, executor):
+    # One pass over every assignment: fetch, grade, post (used by the benchmarks)
+    logging.info("Starting processing of assignments.")
+    cache_before = grade_cache.stats()
+    stages_before = METRICS.stage_totals()
+
+    # Every assignment streams through its own pipeline at once, sharing the grading workers
+    def process(assignment):
+        try:
+            process_assignment(assignment, store, ledger, executor)
+        except Exception as e:
+            logging.critical(f"Unexpected error while processing assignment {assignment['name']}: {e}")
+
+    with ThreadPoolExecutor(max_workers=max(len(ASSIGNMENTS), 1)) as pool:
+        list(pool.map(process, ASSIGNMENTS))
+
+    log_cache_hit_rate(cache_before, "this cycle")
+    log_stage_timings(stages_before, "this cycle")
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,237 @@
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+# A local stand-in for the parts of the Canvas API the autograder uses. It serves
+# submissions with Link-header pagination, can add latency and throttle responses,
+# and records every grade it receives so a benchmark can check what was posted.
+
+
+class FakeCanvas:
+    def __init__(self, course_id, assignments, latency=0.0, throttle_rate=0.0, page_size=10, seed=0):
+        # assignments maps assignment_id to a list of submission dicts
+        self.course_id = course_id
+        self.assignments = {int(assignment_id): submissions for assignment_id, submissions in assignments.items()}
+        self.assignment_info = {}  # optional extra fields (due_at, lock_at, ...) per assignment
+        self.latency = latency
+        self.throttle_rate = throttle_rate
+        self.page_size = page_size
+        self.random = random.Random(seed)
+        self.retry_after = '0'             # Retry-After sent with a throttled response
+        self.rate_limit_remaining = 700.0  # X-Rate-Limit-Remaining sent with every response
+        self.server_errors = 0             # the next this many requests are answered with a 500
+
+        self.lock = threading.Lock()
+        self.requests = Counter()   # (method, endpoint) -> count
+        self.throttled = 0
+        self.posted_grades = {}     # (assignment_id, user_id) -> (score, comment)
+        self.progress = {}          # progress_id -> workflow_state
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler_class())
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server.server_port}/api/v1/"
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def reset_counters(self):
+        with self.lock:
+            self.requests.clear()
+            self.throttled = 0
+
+    @property
+    def total_requests(self):
+        with self.lock:
+            return sum(self.requests.values())
+
+    def _record_grade(self, assignment_id, user_id, score, comment):
+        with self.lock:
+            self.posted_grades[(assignment_id, user_id)] = (score, comment)
+            for submission in self.assignments.get(assignment_id, []):
+                if submission['user_id'] == user_id:
+                    submission['workflow_state'] = 'graded'
+                    submission['score'] = score
+                    if comment:
+                        submission.setdefault('submission_comments', []).append({'comment': comment})
+
+    def _handler_class(self):
+        canvas = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'  # keep-alive, like Canvas
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send_json(self, status, payload, headers=None):
+                body = json.dumps(payload).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.send_header('X-Rate-Limit-Remaining', str(canvas.rate_limit_remaining))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _read_body(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                return self.rfile.read(length).decode('utf-8') if length else ''
+
+            def _begin(self, method, endpoint):
+                # Counts the request, sleeps for the injected latency and maybe throttles it
+                with canvas.lock:
+                    canvas.requests[(method, endpoint)] += 1
+                    throttle = canvas.random.random() < canvas.throttle_rate
+                    if throttle:
+                        canvas.throttled += 1
+                    fail = canvas.server_errors > 0
+                    if fail:
+                        canvas.server_errors -= 1
+                if canvas.latency:
+                    time.sleep(canvas.latency)
+                if fail:
+                    self._read_body()
+                    self._send_json(500, {'errors': [{'message': 'Internal Server Error'}]})
+                    return False
+                if throttle:
+                    self._read_body()
+                    self._send_json(429, {'errors': [{'message': 'Rate Limit Exceeded'}]}, {'Retry-After': canvas.retry_after})
+                    return False
+                return True
+
+            def _paginate(self, items, query, path):
+                page = int(query.get('page', ['1'])[0])
+                per_page = int(query.get('per_page', [canvas.page_size])[0])
+                per_page = min(per_page, canvas.page_size)
+                last_page = max(1, -(-len(items) // per_page))
+                base = f"{canvas.url.rstrip('/')}{path[len('/api/v1'):]}"
+                other = '&'.join(
+                    f"{key}={value}" for key, values in query.items() if key not in ('page', 'per_page')
+                    for value in values
+                )
+                def link(number):
+                    return f"{base}?{other + '&' if other else ''}page={number}&per_page={per_page}"
+                links = [f'<{link(1)}>; rel="first"', f'<{link(last_page)}>; rel="last"']
+                if page < last_page:
+                    links.append(f'<{link(page + 1)}>; rel="next"')
+                start = (page - 1) * per_page
+                return items[start:start + per_page], {'Link': ','.join(links)}
+
+            def do_GET(self):
+                parsed = urlparse(self.path)
+                query = parse_qs(parsed.query)
+                path = parsed.path
+
+                match = re.fullmatch(r'/api/v1/courses/\d+/assignments/(\d+)/submissions', path)
+                if match:
+                    if not self._begin('GET', 'submissions'):
+                        return
+                    with canvas.lock:
+                        items = [dict(s) for s in canvas.assignments.get(int(match.group(1)), [])]
+                    if 'submission_comments' not in query.get('include[]', []):
+                        for item in items:
+                            item.pop('submission_comments', None)
+                    page, headers = self._paginate(items, query, path)
+                    return self._send_json(200, page, headers)
+
+                if re.fullmatch(r'/api/v1/courses/\d+/students/submissions', path):
+                    if not self._begin('GET', 'students/submissions'):
+                        return
+                    assignment_ids = [int(value) for value in query.get('assignment_ids[]', [])]
+                    student_ids = {int(value) for value in query.get('student_ids[]', []) if value != 'all'}
+                    state = query.get('workflow_state', [None])[0]
+                    since = query.get('submitted_since', [None])[0]
+                    with canvas.lock:
+                        items = [
+                            dict(s) for assignment_id in assignment_ids
+                            for s in canvas.assignments.get(assignment_id, [])
+                            if (state is None or s['workflow_state'] == state)
+                            and (since is None or (s.get('submitted_at') or '') >= since)
+                            and (not student_ids or s['user_id'] in student_ids)
+                        ]
+                    if 'submission_comments' not in query.get('include[]', []):
+                        for item in items:
+                            item.pop('submission_comments', None)
+                    page, headers = self._paginate(items, query, path)
+                    return self._send_json(200, page, headers)
+
+                match = re.fullmatch(r'/api/v1/courses/\d+/assignments/(\d+)', path)
+                if match:
+                    if not self._begin('GET', 'assignment'):
+                        return
+                    assignment_id = int(match.group(1))
+                    return self._send_json(200, dict({'id': assignment_id}, **canvas.assignment_info.get(assignment_id, {})))
+
+                if re.fullmatch(r'/api/v1/courses/\d+/assignments', path):
+                    if not self._begin('GET', 'assignments'):
+                        return
+                    items = [
+                        dict({'id': assignment_id}, **canvas.assignment_info.get(assignment_id, {}))
+                        for assignment_id in canvas.assignments
+                    ]
+                    page, headers = self._paginate(items, query, path)
+                    return self._send_json(200, page, headers)
+
+                match = re.fullmatch(r'/api/v1/progress/(\d+)', path)
+                if match:
+                    if not self._begin('GET', 'progress'):
+                        return
+                    progress_id = int(match.group(1))
+                    with canvas.lock:
+                        state = canvas.progress.get(progress_id)
+                    if state is None:
+                        return self._send_json(404, {'errors': [{'message': 'not found'}]})
+                    return self._send_json(200, {'id': progress_id, 'workflow_state': state, 'completion': 100})
+
+                self._send_json(404, {'errors': [{'message': 'not found'}]})
+
+            def do_PUT(self):
+                match = re.fullmatch(r'/api/v1/courses/\d+/assignments/(\d+)/submissions/(\d+)', urlparse(self.path).path)
+                if not match:
+                    self._read_body()
+                    return self._send_json(404, {'errors': [{'message': 'not found'}]})
+                if not self._begin('PUT', 'submission'):
+                    return
+                payload = json.loads(self._read_body() or '{}')
+                canvas._record_grade(
+                    int(match.group(1)), int(match.group(2)),
+                    payload.get('submission', {}).get('posted_grade'),
+                    payload.get('comment', {}).get('text_comment')
+                )
+                self._send_json(200, {'id': int(match.group(2))})
+
+            def do_POST(self):
+                match = re.fullmatch(r'/api/v1/courses/\d+/assignments/(\d+)/submissions/update_grades', urlparse(self.path).path)
+                if not match:
+                    self._read_body()
+                    return self._send_json(404, {'errors': [{'message': 'not found'}]})
+                if not self._begin('POST', 'update_grades'):
+                    return
+                grades = {}
+                for key, values in parse_qs(self._read_body()).items():
+                    field = re.fullmatch(r'grade_data\[(\d+)\]\[(\w+)\]', key)
+                    if field:
+                        grades.setdefault(int(field.group(1)), {})[field.group(2)] = values[0]
+                for user_id, data in grades.items():
+                    canvas._record_grade(int(match.group(1)), user_id, data.get('posted_grade'), data.get('text_comment'))
+                with canvas.lock:
+                    progress_id = len(canvas.progress) + 1
+                    canvas.progress[progress_id] = 'completed'
+                self._send_json(200, {'id': progress_id, 'workflow_state': 'queued', 'completion': 0})
+
+        return Handler
@@ -0,0 +1,56 @@
+import argparse
+import os
+import sys
+import time
+
+# Compares extract_cf_text() with the BeautifulSoup get_text() path grade() used before,
+# on synthetic Canvas rich-text bodies. Run from the repository root:
+#
+#     python -m benchmarks.html_extraction --submissions 2000
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from bs4 import BeautifulSoup  # noqa: E402
+
+from benchmarks.synthetic_submissions import generate_submissions  # noqa: E402
+from grading_scripts.cf_text import extract_cf_text  # noqa: E402
+from grading_scripts.grade_cache import normalize_cf  # noqa: E402
+
+
+def soup_text(body):
+    return BeautifulSoup(body, 'html.parser').get_text(separator='\n').strip()
+
+
+def time_per_body(extract, bodies, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for body in bodies:
+            extract(body)
+        best = min(best, time.perf_counter() - started)
+    return best / len(bodies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark HTML-to-CF text extraction.")
+    parser.add_argument('--submissions', type=int, default=1000, help="number of synthetic bodies")
+    parser.add_argument('--repeat', type=int, default=5, help="timing runs per extractor (best is reported)")
+    args = parser.parse_args()
+
+    bodies = [submission['body'] for submission in generate_submissions(args.submissions, duplicate_fraction=0.0)]
+
+    # Both paths must agree once whitespace is normalized, or the speedup is meaningless
+    mismatches = sum(1 for body in bodies if extract_cf_text(body) != normalize_cf(soup_text(body)))
+
+    soup_seconds = time_per_body(soup_text, bodies, args.repeat)
+    fast_seconds = time_per_body(extract_cf_text, bodies, args.repeat)
+    print(f"bodies: {len(bodies)} (mean {sum(map(len, bodies)) / len(bodies):.0f} characters)")
+    print(f"BeautifulSoup html.parser: {soup_seconds * 1e6:.1f} us/body")
+    print(f"extract_cf_text:           {fast_seconds * 1e6:.1f} us/body")
+    print(f"speedup: {soup_seconds / fast_seconds:.1f}x")
+    print(f"output mismatches: {mismatches}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,149 @@
+import argparse
+import json
+import os
+import resource
+import sys
+import tempfile
+import time
+
+# End-to-end throughput benchmark: runs full Main.run_cycle() passes against a local fake
+# Canvas loaded with synthetic submissions and reports throughput, per-submission grading
+# latency, HTTP calls and peak memory. Run from the repository root:
+#
+#     python -m benchmarks.run_benchmark --submissions 300 --latency 0.05
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from benchmarks.fake_canvas import FakeCanvas  # noqa: E402
+from benchmarks.synthetic_submissions import generate_submissions  # noqa: E402
+
+COURSE_ID = 1
+ASSIGNMENT_ID = 1001
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def peak_rss_mb():
+    # Peak resident memory of this process and of its live grading workers (Linux /proc only)
+    main_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    workers_kb = 0
+    try:
+        with open(f"/proc/{os.getpid()}/task/{os.getpid()}/children") as f:
+            children = f.read().split()
+        for pid in children:
+            with open(f"/proc/{pid}/status") as f:
+                for line in f:
+                    if line.startswith('VmHWM:'):
+                        workers_kb += int(line.split()[1])
+    except OSError:
+        pass
+    return main_kb / 1024, workers_kb / 1024
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark a full autograder cycle against a fake Canvas.")
+    parser.add_argument('--submissions', type=int, default=200, help="number of synthetic submissions")
+    parser.add_argument('--cycles', type=int, default=2, help="cycles to run (later cycles measure steady state)")
+    parser.add_argument('--latency', type=float, default=0.02, help="seconds added to every Canvas request")
+    parser.add_argument('--throttle-rate', type=float, default=0.02, help="fraction of requests answered with 429")
+    parser.add_argument('--page-size', type=int, default=50, help="submissions per Canvas page")
+    parser.add_argument('--valid-fraction', type=float, default=0.7)
+    parser.add_argument('--malformed-fraction', type=float, default=0.15)
+    parser.add_argument('--duplicate-fraction', type=float, default=0.1)
+    parser.add_argument('--grader-workers', type=int, default=0, help="0 for one per CPU core")
+    parser.add_argument('--canvas-workers', type=int, default=8)
+    parser.add_argument('--chunk-size', type=int, default=50, help="bulk grade chunk size")
+    parser.add_argument('--grader', default='grade_design1', help="grader to run, e.g. rubric:design1")
+    parser.add_argument('--memory-limit-mb', type=int, default=0, help="grade each submission in its own limited process")
+    parser.add_argument('--cpu-limit', type=int, default=0, help="CPU seconds per submission (also isolates)")
+    parser.add_argument('--no-cache', action='store_true', help="disable the grade cache")
+    parser.add_argument('--full-fetch', action='store_true', help="disable incremental fetching")
+    parser.add_argument('--json', action='store_true', help="print one JSON object per cycle")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    submissions = generate_submissions(
+        args.submissions, valid_fraction=args.valid_fraction,
+        malformed_fraction=args.malformed_fraction, duplicate_fraction=args.duplicate_fraction
+    )
+    canvas = FakeCanvas(
+        COURSE_ID, {ASSIGNMENT_ID: submissions},
+        latency=args.latency, throttle_rate=args.throttle_rate, page_size=args.page_size
+    ).start()
+
+    # Fresh state for every run; Main reads its settings from the environment at import
+    state_dir = tempfile.mkdtemp(prefix='autograder-bench-')
+    os.environ.update({
+        'API_TOKEN': 'benchmark',
+        'CANVAS_URL': canvas.url,
+        'INCREMENTAL_FETCH': 'false' if args.full_fetch else 'true',
+        'CURSOR_STORE_PATH': os.path.join(state_dir, 'submission_cursors.json'),
+        'LEDGER_PATH': os.path.join(state_dir, 'grading_ledger.sqlite3'),
+        'GRADE_CACHE_PATH': '' if args.no_cache else os.path.join(state_dir, 'grade_cache.sqlite3'),
+        'GRADER_WORKERS': str(args.grader_workers),
+        'CANVAS_WORKERS': str(args.canvas_workers),
+        'BULK_GRADE_CHUNK_SIZE': str(args.chunk_size),
+        'GRADER_MEMORY_LIMIT_MB': str(args.memory_limit_mb),
+        'GRADER_CPU_LIMIT': str(args.cpu_limit),
+    })
+    os.chdir(state_dir)  # autograder.log goes with the rest of the run's state
+
+    import Main
+    from metrics import METRICS
+    Main.COURSE_ID = COURSE_ID
+    Main.ASSIGNMENTS = [{'id': ASSIGNMENT_ID, 'name': 'Benchmark', 'grader': args.grader}]
+    store, ledger, executor = Main.setup()
+
+    try:
+        for cycle in range(1, args.cycles + 1):
+            canvas.reset_counters()
+            executor.durations.clear()
+            stages_before = METRICS.stage_totals()
+            started = time.perf_counter()
+            Main.run_cycle(store, ledger, executor)
+            elapsed = time.perf_counter() - started
+
+            durations = list(executor.durations)
+            stages = {
+                stage: (count - stages_before.get(stage, (0, 0.0))[0], seconds - stages_before.get(stage, (0, 0.0))[1])
+                for stage, (count, seconds) in METRICS.stage_totals().items()
+            }
+            main_rss, workers_rss = peak_rss_mb()
+            report = {
+                'cycle': cycle,
+                'submissions_graded': len(durations),
+                'cycle_seconds': round(elapsed, 3),
+                'submissions_per_second': round(len(durations) / elapsed, 2) if elapsed else 0.0,
+                'grade_p50_ms': round(percentile(durations, 0.50) * 1000, 2),
+                'grade_p99_ms': round(percentile(durations, 0.99) * 1000, 2),
+                'http_calls': canvas.total_requests,
+                'http_calls_by_endpoint': {f"{method} {endpoint}": count for (method, endpoint), count in canvas.requests.items()},
+                'throttled_responses': canvas.throttled,
+                'grades_posted_total': len(canvas.posted_grades),
+                'peak_rss_mb': round(main_rss, 1),
+                'peak_worker_rss_mb': round(workers_rss, 1),
+                'stage_mean_ms': {stage: round(seconds / count * 1000, 3) for stage, (count, seconds) in sorted(stages.items()) if count},
+            }
+            if args.json:
+                print(json.dumps(report))
+                continue
+            print(f"Cycle {cycle}:")
+            for key, value in report.items():
+                if key != 'cycle':
+                    print(f"  {key}: {value}")
+    finally:
+        executor.shutdown()
+        canvas.stop()
+
+
+if __name__ == '__main__':
+    main()
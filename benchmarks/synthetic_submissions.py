@@ -0,0 +1,93 @@
+import random
+
+# Generates Canvas-shaped Design1 submissions: valid construction files with varied 5'
+# tails, malformed text, and edge cases that stress the parser and simulator.
+
+STEPS = [
+    "PCR ceaB-F ceaB-R ColE2 pcrpdt",
+    "Digest pcrpdt BglII,XhoI 1 pcrdig",
+    "Digest pBca9145-Bca1089 BglII,XhoI 1 vectdig",
+    "Ligate pcrdig vectdig pBca9145-ceaB",
+]
+FORWARD_ANNEALING = "AGATCTatgagcggtggcgatggacg"
+REVERSE_ANNEALING = "CTCGAGttaGGATCCttacttaccccgatgaatatc"
+
+
+def random_bases(rng, length):
+    return ''.join(rng.choice('acgt') for _ in range(length))
+
+
+def valid_cf(rng):
+    # The reference answer with random 5' tails, so most submissions are not byte-identical
+    return STEPS + [
+        "",
+        f"oligo ceaB-F {random_bases(rng, 5)}{FORWARD_ANNEALING}",
+        f"oligo ceaB-R {random_bases(rng, 5)}{REVERSE_ANNEALING}",
+    ]
+
+
+def malformed_cf(rng):
+    return rng.choice([
+        ["I don't know how to do this one"],
+        ["PCR ceaB-F ceaB-R", "Digest pcrpdt", "oligo ceaB-F"],
+        ["PCR ceaB-F ceaB-R ColE2 pcrpdt"] + [random_bases(rng, 60) for _ in range(3)],
+    ])
+
+
+def edge_case_cf(rng):
+    kind = rng.choice(['no_tails', 'two_pcrs', 'missing_template', 'huge_oligo', 'many_steps'])
+    if kind == 'no_tails':
+        return STEPS + ["", f"oligo ceaB-F {FORWARD_ANNEALING}", f"oligo ceaB-R {REVERSE_ANNEALING}"]
+    if kind == 'two_pcrs':
+        return ["PCR ceaB-F ceaB-R ColE2 pcr2"] + valid_cf(rng)
+    if kind == 'missing_template':
+        return [STEPS[0].replace('ColE2', 'pUC19')] + valid_cf(rng)[1:]
+    if kind == 'huge_oligo':
+        return STEPS + ["", f"oligo ceaB-F {random_bases(rng, 5000)}{FORWARD_ANNEALING}",
+                        f"oligo ceaB-R {random_bases(rng, 5)}{REVERSE_ANNEALING}"]
+    # Many redundant digest/ligate steps
+    extra = []
+    product = "pBca9145-ceaB"
+    for i in range(20):
+        extra.append(f"Digest {product} BglII,XhoI 1 dig{i}")
+        extra.append(f"Ligate dig{i} vectdig lig{i}")
+        product = f"lig{i}"
+    return valid_cf(rng)[:4] + extra + valid_cf(rng)[4:]
+
+
+def to_canvas_html(lines, rng):
+    # Canvas' rich-text editor wraps every line in a paragraph and sprinkles in spans,
+    # inline styles and non-breaking spaces
+    paragraphs = []
+    for line in lines:
+        if not line:
+            paragraphs.append("<p>&nbsp;</p>")
+        elif rng.random() < 0.3:
+            paragraphs.append(f'<p><span style="font-family: courier new, courier;">{line}</span></p>')
+        else:
+            paragraphs.append(f"<p>{line.replace(' ', '&nbsp;', 1) if rng.random() < 0.2 else line}</p>")
+    return "\n".join(paragraphs)
+
+
+def generate_submissions(count, valid_fraction=0.7, malformed_fraction=0.15, duplicate_fraction=0.1, seed=0):
+    rng = random.Random(seed)
+    submissions = []
+    for i in range(count):
+        roll = rng.random()
+        if submissions and rng.random() < duplicate_fraction:
+            body = rng.choice(submissions)['body']  # an unchanged copy of an earlier submission
+        elif roll < valid_fraction:
+            body = to_canvas_html(valid_cf(rng), rng)
+        elif roll < valid_fraction + malformed_fraction:
+            body = to_canvas_html(malformed_cf(rng), rng)
+        else:
+            body = to_canvas_html(edge_case_cf(rng), rng)
+        submissions.append({
+            'id': 100000 + i,
+            'user_id': 200000 + i,
+            'attempt': 1,
+            'workflow_state': 'submitted',
+            'submitted_at': f"2024-02-01T{10 + i // 3600 % 10:02d}:{i // 60 % 60:02d}:{i % 60:02d}Z",
+            'body': body,
+        })
+    return submissions
@@ -0,0 +1,346 @@
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urljoin, urlparse, parse_qs, urlencode, urlunparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+
+from metrics import METRICS
+
+# Canvas meters API use with a leaky bucket and reports what is left in X-Rate-Limit-Remaining.
+# Once it drops below RATE_LIMIT_FLOOR we start spacing requests out, more aggressively the
+# closer we get to zero, instead of waiting to be rejected.
+RATE_LIMIT_FLOOR = 150.0
+RATE_LIMIT_MAX_DELAY = 2.0  # seconds between requests when the bucket is empty
+RETRY_BASE_DELAY = 1.0      # first backoff after a 429/5xx, doubled on each retry
+RETRY_MAX_DELAY = 60.0
+
+# Requests that are safe to repeat whatever happened to the first try. A PUT or POST that
+# Canvas may already have applied would add the comment (or queue the bulk job) twice, so
+# those are only retried when Canvas turned them away or the connection never opened.
+IDEMPOTENT_METHODS = ('GET', 'HEAD')
+
+
+class CanvasError(Exception):
+    pass
+
+
+def parse_link_header(response, url):
+    # Canvas paginates with RFC 5988 Link headers: <https://...&page=2>; rel="next", ...
+    link_header = response.headers.get('Link', None)
+    if not link_header:
+        return {}
+    links = {}
+    for part in link_header.split(','):
+        if ';' not in part:
+            continue
+        target, rel = part.split(';', 1)
+        rel = rel.strip().replace('rel=', '').replace('"', '')
+        links[rel] = urljoin(url, target.strip().strip('<>'))
+    return links
+
+
+def with_page(url, page):
+    parsed = urlparse(url)
+    query = parse_qs(parsed.query, keep_blank_values=True)
+    query['page'] = [str(page)]
+    return urlunparse(parsed._replace(query=urlencode(query, doseq=True)))
+
+
+def numeric_page(url):
+    # Page number of a Canvas page link, or None for bookmark-style cursors
+    pages = parse_qs(urlparse(url).query).get('page')
+    if pages and pages[0].isdigit():
+        return int(pages[0])
+    return None
+
+
+def new_submissions_params(assignment_id, submitted_since=None):
+    # Only submissions still waiting for a grade, optionally limited to those
+    # submitted (or resubmitted) after `submitted_since`
+    params = {
+        'student_ids[]': 'all',
+        'assignment_ids[]': assignment_id,
+        'workflow_state': 'submitted',
+        'per_page': 100
+    }
+    if submitted_since:
+        params['submitted_since'] = submitted_since
+    return params
+
+
+def never_sent(error):
+    # True when the connection couldn't be opened, so Canvas can't have seen the request
+    if isinstance(error, requests.ConnectTimeout):
+        return True
+    reason = error.args[0] if error.args else None
+    return isinstance(getattr(reason, 'reason', reason), NewConnectionError)
+
+
+class CanvasClient:
+    def __init__(self, base_url, api_token, max_workers=8, timeout=60, max_retries=5):
+        self.base_url = base_url
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.max_retries = max_retries
+
+        # One keep-alive session shared by every worker thread, with enough pooled
+        # connections that concurrent requests don't queue for a socket
+        self.session = requests.Session()
+        self.session.headers['Authorization'] = f'Bearer {api_token}'
+        adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='canvas')
+        self._throttle_lock = threading.Lock()
+        self._next_request_at = 0.0
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+        self.session.close()
+
+    def url(self, path):
+        return urljoin(self.base_url, path)
+
+    def map(self, func, items):
+        # Run func over items on the client's thread pool, returning results in input order.
+        # func must not call map itself: nested waits on the same pool can deadlock it.
+        return list(self.executor.map(func, items))
+
+    # Rate limiting
+
+    def _wait_for_turn(self):
+        with self._throttle_lock:
+            delay = self._next_request_at - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+    def _delay_all(self, seconds):
+        with self._throttle_lock:
+            self._next_request_at = max(self._next_request_at, time.monotonic() + seconds)
+
+    def _record_rate_limit(self, response):
+        remaining = response.headers.get('X-Rate-Limit-Remaining')
+        if remaining is None:
+            return
+        try:
+            remaining = float(remaining)
+        except ValueError:
+            return
+        if remaining < RATE_LIMIT_FLOOR:
+            delay = RATE_LIMIT_MAX_DELAY * (1 - max(remaining, 0.0) / RATE_LIMIT_FLOOR)
+            METRICS.inc('autograder_rate_limit_delays_total')
+            logging.debug("Canvas rate limit bucket low (%s), spacing requests by %.2fs", remaining, delay)
+            self._delay_all(delay)
+
+    @staticmethod
+    def _is_throttled(response):
+        # Canvas answers 403 "Rate Limit Exceeded" when the bucket runs dry; proxies may use 429
+        return response.status_code == 429 or (
+            response.status_code == 403 and 'Rate Limit Exceeded' in response.text
+        )
+
+    def request(self, method, url, **kwargs):
+        response = None
+        idempotent = method.upper() in IDEMPOTENT_METHODS
+        for attempt in range(self.max_retries + 1):
+            self._wait_for_turn()
+            backoff = min(RETRY_BASE_DELAY * (2 ** attempt), RETRY_MAX_DELAY)
+            try:
+                with METRICS.time(f"http_{method.lower()}"):
+                    response = self.session.request(method, url, timeout=self.timeout, **kwargs)
+            except requests.RequestException as e:
+                METRICS.inc('autograder_http_requests_total', method=method, status='error')
+                if attempt == self.max_retries or not (idempotent or never_sent(e)):
+                    raise
+                logging.warning(f"{method} {url} failed ({e}), retrying in {backoff:.1f}s")
+                self._delay_all(backoff)
+                continue
+
+            METRICS.inc('autograder_http_requests_total', method=method, status=response.status_code)
+            self._record_rate_limit(response)
+            if self._is_throttled(response) or (idempotent and response.status_code >= 500):
+                if attempt == self.max_retries:
+                    break
+                retry_after = response.headers.get('Retry-After')
+                delay = float(retry_after) if retry_after and retry_after.isdigit() else backoff
+                logging.warning(f"{method} {url} returned {response.status_code}, retrying in {delay:.1f}s")
+                self._delay_all(delay)
+                continue
+            return response
+        return response
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def put(self, url, **kwargs):
+        return self.request('PUT', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    # Pagination
+
+    def iter_pages(self, url, params=None, prefetch=4):
+        # Yields each page of items as soon as it (and every page before it) has arrived;
+        # raises CanvasError if a page can't be fetched. When Canvas reports a numbered
+        # last page, up to `prefetch` pages are requested ahead concurrently; otherwise
+        # (bookmark pagination) the next links are followed one at a time.
+        response = self.get(url, params=params)
+        if response.status_code != 200:
+            raise CanvasError(f"Failed to retrieve {url}, status code: {response.status_code}")
+        yield response.json()
+        links = parse_link_header(response, response.url)
+
+        last_page = numeric_page(links['last']) if 'last' in links else None
+        next_page = numeric_page(links['next']) if 'next' in links else None
+        if last_page and next_page:
+            window = deque()
+            for page in range(next_page, last_page + 1):
+                window.append(self.executor.submit(self._get_page, with_page(links['next'], page)))
+                if len(window) >= max(prefetch, 1):
+                    yield window.popleft().result()
+            while window:
+                yield window.popleft().result()
+            return
+
+        next_url = links.get('next')
+        while next_url:
+            items, links = self._get_page_and_links(next_url)
+            yield items
+            next_url = links.get('next')
+
+    def get_paginated(self, url, params=None):
+        # Returns every item across all pages, or None if any page failed. Numbered pages
+        # are all fetched concurrently. Used for small listings; submissions are streamed
+        # page by page with iter_pages.
+        items = []
+        try:
+            for page in self.iter_pages(url, params=params, prefetch=self.max_workers):
+                items.extend(page)
+        except CanvasError as e:
+            logging.error(str(e))
+            return None
+        return items
+
+    def _get_page(self, url):
+        return self._get_page_and_links(url)[0]
+
+    def _get_page_and_links(self, url):
+        response = self.get(url)
+        if response.status_code != 200:
+            raise CanvasError(f"Failed to retrieve {url}, status code: {response.status_code}")
+        return response.json(), parse_link_header(response, url)
+
+    # Canvas endpoints used by the autograder
+
+    def get_assignments(self, course_id):
+        return self.get_paginated(self.url(f"courses/{course_id}/assignments"), params={'per_page': 100})
+
+    def get_assignment(self, course_id, assignment_id):
+        try:
+            response = self.get(self.url(f"courses/{course_id}/assignments/{assignment_id}"))
+        except Exception as e:
+            logging.error(f"Exception occurred while retrieving assignment {assignment_id}: {e}")
+            return None
+        if response.status_code == 200:
+            return response.json()
+        logging.error(f"Failed to retrieve assignment {assignment_id}, status code: {response.status_code}")
+        return None
+
+    def iter_submission_pages(self, course_id, assignment_id, prefetch=4, include=()):
+        # include adds Canvas' optional fields, e.g. ['submission_comments']
+        params = {'per_page': 100}
+        if include:
+            params['include[]'] = list(include)
+        return self.iter_pages(
+            self.url(f"courses/{course_id}/assignments/{assignment_id}/submissions"),
+            params=params, prefetch=prefetch
+        )
+
+    def iter_new_submission_pages(self, course_id, assignment_id, submitted_since=None, prefetch=4):
+        return self.iter_pages(
+            self.url(f"courses/{course_id}/students/submissions"),
+            params=new_submissions_params(assignment_id, submitted_since), prefetch=prefetch
+        )
+
+    def get_current_grades(self, course_id, assignment_id, user_ids):
+        # {user_id: (score, newest comment text)} as Canvas has them now, or None on failure
+        params = {
+            'assignment_ids[]': [assignment_id], 'student_ids[]': list(user_ids),
+            'include[]': ['submission_comments'], 'per_page': 100
+        }
+        try:
+            pages = list(self.iter_pages(self.url(f"courses/{course_id}/students/submissions"), params=params))
+        except Exception as e:
+            logging.error(f"Exception occurred while checking current grades of {len(user_ids)} students: {e}")
+            return None
+        grades = {}
+        for submission in (submission for page in pages for submission in page):
+            comments = submission.get('submission_comments') or []
+            grades[submission['user_id']] = (submission.get('score'), comments[-1].get('comment') if comments else None)
+        return grades
+
+    def update_submission(self, course_id, assignment_id, user_id, score, comments):
+        combined_comment = '\n'.join(comments)  # Joins all comments with a newline character between them
+        payload = {
+            'submission': {'posted_grade': score},
+            'comment': {'text_comment': combined_comment}
+        }
+        try:
+            response = self.put(
+                self.url(f"courses/{course_id}/assignments/{assignment_id}/submissions/{user_id}"),
+                json=payload
+            )
+        except Exception as e:
+            logging.error(f"Exception occurred while updating submission for user {user_id}: {e}")
+            return False
+        if response.status_code == 200:
+            logging.debug("Successfully updated submission for user %s", user_id)
+            return True
+        logging.error(f"Failed to update submission for user {user_id}, status code: {response.status_code}, response: {response.text}")
+        return False
+
+    def update_submissions(self, course_id, assignment_id, grades):
+        # grades is a list of (user_id, score, comments); returns {user_id: success}
+        results = self.map(
+            lambda grade: self.update_submission(course_id, assignment_id, *grade),
+            grades
+        )
+        return {user_id: success for (user_id, _, _), success in zip(grades, results)}
+
+    def bulk_update_grades(self, course_id, assignment_id, grades):
+        # Queues grades and comments for many students in one request through the
+        # update_grades endpoint. Returns the Canvas Progress object, or None on failure.
+        payload = {}
+        for user_id, score, comments in grades:
+            payload[f'grade_data[{user_id}][posted_grade]'] = score
+            payload[f'grade_data[{user_id}][text_comment]'] = '\n'.join(comments)
+        try:
+            response = self.post(
+                self.url(f"courses/{course_id}/assignments/{assignment_id}/submissions/update_grades"),
+                data=payload
+            )
+        except Exception as e:
+            logging.error(f"Exception occurred while bulk updating {len(grades)} submissions: {e}")
+            return None
+        if response.status_code == 200:
+            return response.json()
+        logging.error(f"Failed to bulk update {len(grades)} submissions, status code: {response.status_code}, response: {response.text}")
+        return None
+
+    def get_progress(self, progress_id):
+        try:
+            response = self.get(self.url(f"progress/{progress_id}"))
+        except Exception as e:
+            logging.error(f"Exception occurred while checking progress {progress_id}: {e}")
+            return None
+        if response.status_code == 200:
+            return response.json()
+        logging.error(f"Failed to check progress {progress_id}, status code: {response.status_code}")
+        return None
@@ -0,0 +1,90 @@
+import logging
+import time
+
+PROGRESS_POLL_INTERVAL = 2.0  # longest wait between checks of a queued bulk update
+PROGRESS_FIRST_POLL = 0.25    # first check comes quickly, small chunks often finish at once
+PROGRESS_TIMEOUT = 300.0      # give up on a bulk update and post individually after this long
+
+
+class GradeBatch:
+    # Collects (user_id, score, comments) results from a grading pass and posts them with
+    # the bulk update_grades endpoint, chunk_size students per request. Any chunk whose
+    # Progress fails (or never finishes) is re-posted one student at a time, except for
+    # the students Canvas shows the job already updated.
+    def __init__(self, client, course_id, assignment_id, chunk_size=50,
+                 poll_interval=PROGRESS_POLL_INTERVAL, progress_timeout=PROGRESS_TIMEOUT):
+        self.client = client
+        self.course_id = course_id
+        self.assignment_id = assignment_id
+        self.chunk_size = chunk_size
+        self.poll_interval = poll_interval
+        self.progress_timeout = progress_timeout
+        self.grades = []
+
+    def __len__(self):
+        return len(self.grades)
+
+    def add(self, user_id, score, comments):
+        self.grades.append((user_id, score, comments))
+
+    def post(self):
+        # Returns {user_id: success} for every grade added to the batch
+        results = {}
+        if not self.grades:
+            return results
+        if self.chunk_size <= 1:
+            return self.client.update_submissions(self.course_id, self.assignment_id, self.grades)
+
+        chunks = [self.grades[i:i + self.chunk_size] for i in range(0, len(self.grades), self.chunk_size)]
+        for number, chunk in enumerate(chunks, 1):
+            if self._post_chunk(chunk):
+                results.update({user_id: True for user_id, _, _ in chunk})
+            else:
+                remaining = self._not_applied(chunk, results)
+                logging.warning(f"Bulk update of chunk {number}/{len(chunks)} failed, posting {len(remaining)} of {len(chunk)} grades individually.")
+                results.update(self.client.update_submissions(self.course_id, self.assignment_id, remaining))
+            posted = sum(1 for success in results.values() if success)
+            logging.info(f"Posted {posted}/{len(self.grades)} grades for assignment {self.assignment_id} ({number}/{len(chunks)} chunks).")
+        return results
+
+    def _not_applied(self, chunk, results):
+        # A failed or timed-out job may still have updated some students, and posting them
+        # again would add the same comment a second time. Those already showing this grade
+        # and comment are marked posted; the rest are returned to be re-posted.
+        current = self.client.get_current_grades(self.course_id, self.assignment_id, [user_id for user_id, _, _ in chunk])
+        if current is None:
+            logging.warning("Could not check which grades of a failed bulk update were applied; some comments may be posted twice.")
+            return chunk
+        remaining = []
+        for user_id, score, comments in chunk:
+            current_score, current_comment = current.get(user_id, (None, None))
+            if current_score is not None and float(current_score) == float(score) and current_comment == '\n'.join(comments):
+                results[user_id] = True
+            else:
+                remaining.append((user_id, score, comments))
+        return remaining
+
+    def _post_chunk(self, chunk):
+        progress = self.client.bulk_update_grades(self.course_id, self.assignment_id, chunk)
+        if progress is None:
+            return False
+        return self._wait_for_progress(progress)
+
+    def _wait_for_progress(self, progress):
+        deadline = time.monotonic() + self.progress_timeout
+        delay = min(PROGRESS_FIRST_POLL, self.poll_interval)
+        while progress.get('workflow_state') not in ('completed', 'failed'):
+            if time.monotonic() > deadline:
+                logging.error(f"Timed out waiting for bulk update progress {progress.get('id')}.")
+                return False
+            time.sleep(delay)
+            delay = min(delay * 2, self.poll_interval)
+            progress = self.client.get_progress(progress['id'])
+            if progress is None:
+                return False
+            logging.debug("Bulk update progress %s: %s %s%%", progress.get('id'), progress.get('workflow_state'), progress.get('completion'))
+
+        if progress['workflow_state'] == 'failed':
+            logging.error(f"Bulk update progress {progress.get('id')} failed: {progress.get('message')}")
+            return False
+        return True
@@ -0,0 +1,302 @@
+import importlib
+import logging
+import math
+import os
+import pickle
+import select
+import signal
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from grading_scripts.simulation import SubmissionTooExpensive
+from metrics import METRICS, STAGE_SECONDS
+
+try:
+    import resource  # Unix only; without it submissions are graded without limits
+except ImportError:
+    resource = None
+
+# Extra time the parent waits beyond the in-worker timeout before it gives up on a worker
+PARENT_GRACE_SECONDS = 10
+
+# Extra time an isolated worker waits beyond the timeout before it kills the submission's process
+CHILD_GRACE_SECONDS = 5
+
+# Exit status of an isolated grading process that ran out of memory
+EXIT_OUT_OF_MEMORY = 3
+
+# Number of recent per-submission grading times kept for reporting
+DURATION_HISTORY = 10000
+
+# Grader functions loaded in this process, keyed by module name under grading_scripts
+# (or 'rubric:<name>')
+_graders = {}
+
+
+class GradingTimeout(BaseException):
+    # Derives from BaseException so the graders' broad `except Exception` handlers
+    # can't swallow it and turn a timeout into partial credit
+    pass
+
+
+def load_grader(module_name):
+    # A grading_scripts module's grade(), or for 'rubric:<name>' the compiled rubric's
+    grader = _graders.get(module_name)
+    if grader is None:
+        if module_name.startswith('rubric:'):
+            rubric = importlib.import_module('grading_scripts.rubric')
+            grader = rubric.load_plan(module_name[len('rubric:'):]).grade
+        else:
+            grader = getattr(importlib.import_module(f'grading_scripts.{module_name}'), 'grade')
+        _graders[module_name] = grader
+    return grader
+
+
+def _reopen_log_files():
+    # A worker forked while another thread was writing the log inherits the file's buffer
+    # lock already held, and would block on its first log message. Give it fresh files.
+    for handler in logging.root.handlers:
+        if isinstance(handler, logging.FileHandler) and handler.stream is not None:
+            handler.stream = handler._open()
+
+
+def _init_worker(module_names):
+    _reopen_log_files()
+    # Import every grader (and pydna with it) and compile every rubric once when the worker starts
+    for module_name in module_names:
+        load_grader(module_name)
+
+
+def _started():
+    return True
+
+
+def _on_alarm(signum, frame):
+    raise GradingTimeout()
+
+
+def too_expensive_result(reason):
+    # A final grade, posted like any other: left ungraded, the same submission would be
+    # retried and use up its whole allowance again on every pass
+    return 0, [f"Submission too expensive to simulate: {reason}. Please simplify the construction file and resubmit."]
+
+
+def timeout_result(timeout):
+    # Whether the alarm stopped it or its process had to be killed
+    return too_expensive_result(f"it took longer than {timeout} seconds to grade")
+
+
+def grade_submission(module_name, submission, timeout, limits=None):
+    # Returns the grader's (score, comments), the seconds it took and the metrics it recorded.
+    # With limits (memory bytes, CPU seconds) the submission is graded in its own process.
+    if limits:
+        return _grade_isolated(module_name, submission, timeout, limits)
+    grader = load_grader(module_name)
+    started = time.perf_counter()
+    if not hasattr(signal, 'setitimer'):
+        return grader(submission), time.perf_counter() - started, METRICS.drain()
+
+    previous_handler = signal.signal(signal.SIGALRM, _on_alarm)
+    signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        result = grader(submission)
+    except GradingTimeout:
+        METRICS.inc('autograder_grading_failures_total', reason='timeout')
+        logging.error(f"Grading submission ID {submission.get('id', 'Unknown')} timed out after {timeout} seconds.")
+        result = timeout_result(timeout)
+    except (SubmissionTooExpensive, MemoryError):
+        METRICS.inc('autograder_grading_failures_total', reason='out_of_memory')
+        logging.error(f"Grading submission ID {submission.get('id', 'Unknown')} ran out of memory.")
+        result = too_expensive_result("it ran out of memory")
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous_handler)
+    return result, time.perf_counter() - started, METRICS.drain()
+
+
+def _address_space_bytes():
+    # Current virtual memory size of this process, or 0 where /proc isn't available
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[0]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        return 0
+
+
+def _apply_limits(memory_limit, cpu_limit):
+    # The memory limit is on top of what the worker already maps (the interpreter, the
+    # graders and the simulator), so it is the memory one submission may allocate
+    if memory_limit:
+        limit = _address_space_bytes() + memory_limit
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    if cpu_limit:
+        # A forked process starts with no CPU time used. Past the limit the kernel kills
+        # it with SIGXCPU, even inside C code where no Python signal handler would run.
+        resource.setrlimit(resource.RLIMIT_CPU, (cpu_limit, cpu_limit + 1))
+        resource.setrlimit(resource.RLIMIT_CORE, (0, 0))  # and without dumping core
+
+
+def _grade_isolated(module_name, submission, timeout, limits):
+    # Forks a process for this one submission, grades it there under the memory and CPU
+    # limits and reads the result back over a pipe. Whatever the submission does, only
+    # that process dies; the worker, with the graders loaded, carries on.
+    submission_id = submission.get('id', 'Unknown')
+    load_grader(module_name)  # so the fork inherits it instead of every child importing it
+    started = time.perf_counter()
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_fd)
+        status = 0
+        try:
+            _apply_limits(*limits)
+            try:
+                payload = pickle.dumps(grade_submission(module_name, submission, timeout))
+            except Exception as e:
+                # Raised again in the worker, as if the grader had run there
+                payload = pickle.dumps(RuntimeError(f"{type(e).__name__}: {e}"))
+            with os.fdopen(write_fd, 'wb') as pipe:
+                pipe.write(payload)
+        except MemoryError:
+            status = EXIT_OUT_OF_MEMORY
+        except BaseException:
+            status = 1
+        finally:
+            os._exit(status)
+
+    os.close(write_fd)
+    chunks = []
+    killed = False
+    deadline = time.monotonic() + timeout + CHILD_GRACE_SECONDS
+    with os.fdopen(read_fd, 'rb') as pipe:
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not select.select([pipe], [], [], remaining)[0]:
+                # Stuck somewhere the alarm in the child can't interrupt
+                os.kill(pid, signal.SIGKILL)
+                killed = True
+                break
+            chunk = os.read(pipe.fileno(), 65536)
+            if not chunk:
+                break
+            chunks.append(chunk)
+    _, status = os.waitpid(pid, 0)
+
+    if not killed and os.WIFEXITED(status) and os.WEXITSTATUS(status) == 0:
+        payload = pickle.loads(b''.join(chunks))
+        if isinstance(payload, Exception):
+            raise payload
+        result, _, child_metrics = payload
+        METRICS.merge(child_metrics)
+    elif killed:
+        METRICS.inc('autograder_grading_failures_total', reason='timeout')
+        logging.error(f"Grading submission ID {submission_id} did not finish in {timeout} seconds, killed it.")
+        result = timeout_result(timeout)
+    elif os.WIFSIGNALED(status) and os.WTERMSIG(status) == signal.SIGXCPU:
+        METRICS.inc('autograder_grading_failures_total', reason='cpu_limit')
+        logging.error(f"Grading submission ID {submission_id} used more than {limits[1]} seconds of CPU time and was killed.")
+        result = too_expensive_result(f"it needed more than {limits[1]} second{'' if limits[1] == 1 else 's'} of computation")
+    elif os.WIFSIGNALED(status) and os.WTERMSIG(status) == signal.SIGKILL:
+        # Not by us, so the kernel: the CPU hard limit or the out-of-memory killer
+        METRICS.inc('autograder_grading_failures_total', reason='killed')
+        logging.error(f"Grading process for submission ID {submission_id} was killed by the system.")
+        result = too_expensive_result("its grading process was killed by the system")
+    elif os.WIFEXITED(status) and os.WEXITSTATUS(status) == EXIT_OUT_OF_MEMORY:
+        METRICS.inc('autograder_grading_failures_total', reason='out_of_memory')
+        logging.error(f"Grading submission ID {submission_id} ran out of memory.")
+        result = too_expensive_result("it ran out of memory")
+    else:
+        METRICS.inc('autograder_grading_failures_total', reason='worker_died')
+        logging.error(f"Grading process for submission ID {submission_id} died (wait status {status}).")
+        result = -1, [f"Grading process died (wait status {status})."]
+    return result, time.perf_counter() - started, METRICS.drain()
+
+
+class GradingExecutor:
+    # Grades submissions on a pool of worker processes that keep the grader modules
+    # imported between cycles. Results come back in submission order.
+    #
+    # With a memory_limit (bytes) or cpu_limit (seconds) every submission is graded in a
+    # process of its own forked from the worker, under those rlimits, and one that exceeds
+    # them gets a "too expensive to simulate" grade instead of taking the worker down.
+    def __init__(self, grader_modules, max_workers=None, timeout=120, memory_limit=0, cpu_limit=0):
+        self.grader_modules = list(dict.fromkeys(grader_modules))
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.timeout = timeout
+        self.limits = (memory_limit, cpu_limit) if memory_limit or cpu_limit else None
+        if self.limits and (resource is None or not hasattr(os, 'fork')):
+            logging.warning("Grading limits need the resource module and os.fork(); grading without them.")
+            self.limits = None
+        self.durations = deque(maxlen=DURATION_HISTORY)  # seconds spent grading recent submissions
+        self._pool_lock = threading.Lock()
+        self.pool = self._new_pool()
+
+    def _new_pool(self):
+        pool = ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            initializer=_init_worker,
+            initargs=(self.grader_modules,)
+        )
+        # The first submit forks every worker; do it now, before the pipeline's threads are
+        # busy, rather than in the middle of a pass
+        pool.submit(_started)
+        return pool
+
+    def _restart_pool(self, broken_pool):
+        # Several threads may notice the same hung or dead pool; only the first replaces it
+        with self._pool_lock:
+            if self.pool is not broken_pool:
+                return
+            logging.warning("Restarting grading worker pool.")
+            broken_pool.shutdown(wait=False, cancel_futures=True)
+            self.pool = self._new_pool()
+
+    def shutdown(self):
+        self.pool.shutdown(wait=True)
+
+    def submit(self, module_name, submission):
+        # Starts grading one submission; pass the returned job to result()
+        pool = self.pool
+        return pool, pool.submit(grade_submission, module_name, submission, self.timeout, self.limits)
+
+    def result(self, submission, job, wait_timeout=None):
+        # (score, comments) of a submitted job. wait_timeout bounds how long to wait for a
+        # worker that is stuck somewhere the in-worker alarm can't interrupt.
+        pool, future = job
+        try:
+            result, duration, worker_metrics = future.result(timeout=wait_timeout)
+        except FutureTimeout:
+            METRICS.inc('autograder_grading_failures_total', reason='hung')
+            logging.error(f"Grading submission ID {submission.get('id', 'Unknown')} did not finish, abandoning it.")
+            self._restart_pool(pool)
+            # Not the submission's fault as far as we know (the worker's own alarm never fired),
+            # so it isn't posted and is graded again on the next pass
+            return -1, ["Grading did not finish in time, will retry."]
+        except BrokenProcessPool as e:
+            METRICS.inc('autograder_grading_failures_total', reason='worker_died')
+            logging.error(f"Grading worker died while grading submission ID {submission.get('id', 'Unknown')}: {e}")
+            self._restart_pool(pool)
+            return -1, [f"Grading worker died: {e}"]
+        except Exception as e:
+            METRICS.inc('autograder_grading_failures_total', reason='error')
+            logging.error(f"Unexpected error grading submission ID {submission.get('id', 'Unknown')}: {e}")
+            return -1, [f"Unexpected grading error: {e}"]
+        self.durations.append(duration)
+        METRICS.merge(worker_metrics)
+        METRICS.observe(STAGE_SECONDS, duration, stage='grade')
+        return result
+
+    def grade(self, module_name, submissions):
+        # Returns a (score, comments) tuple for each submission, in the same order
+        if not submissions:
+            return []
+        jobs = [self.submit(module_name, submission) for submission in submissions]
+
+        # Every submission enforces its own timeout inside the worker; this deadline only
+        # catches a worker that is stuck somewhere the alarm can't interrupt
+        rounds = math.ceil(len(submissions) / self.max_workers)
+        wait([future for _, future in jobs], timeout=rounds * self.timeout + PARENT_GRACE_SECONDS)
+        return [self.result(submission, job, wait_timeout=0) for submission, job in zip(submissions, jobs)]
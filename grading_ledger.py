@@ -0,0 +1,125 @@
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+
+RETRY_BASE_DELAY = 60.0    # seconds before the first retry of a failed grade post
+RETRY_MAX_DELAY = 3600.0   # backoff between retries is doubled up to this
+
+# Status of a ledger row
+POSTED = 'posted'          # grade is in Canvas
+FAILED = 'failed'          # post failed, waiting for its next retry
+SUPERSEDED = 'superseded'  # a failed post replaced by a newer attempt; never retried
+
+
+def content_hash(submission):
+    return hashlib.sha256((submission.get('body') or '').encode('utf-8')).hexdigest()
+
+
+class GradingLedger:
+    # Local record of every grade the autograder has posted or failed to post, so a
+    # restart only grades new work and failed posts are retried with backoff instead
+    # of being lost. Safe to share between threads.
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self.db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        with self._lock, self.db:
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS grades ("
+                "assignment_id INTEGER NOT NULL, "
+                "user_id INTEGER NOT NULL, "
+                "attempt INTEGER NOT NULL, "
+                "content_hash TEXT NOT NULL, "
+                "score REAL NOT NULL, "
+                "comments TEXT NOT NULL, "
+                "posted_at REAL, "
+                "status TEXT NOT NULL, "
+                "retries INTEGER NOT NULL DEFAULT 0, "
+                "next_retry_at REAL, "
+                "PRIMARY KEY (assignment_id, user_id, attempt, content_hash))"
+            )
+            self.db.execute("CREATE INDEX IF NOT EXISTS grades_retry ON grades (status, next_retry_at)")
+
+    def close(self):
+        self.db.close()
+
+    @staticmethod
+    def _key(assignment_id, submission):
+        return (assignment_id, submission['user_id'], submission.get('attempt') or 0, content_hash(submission))
+
+    def status(self, assignment_id, submission):
+        # Ledger status of this exact attempt and content, or None if it was never graded
+        with self._lock:
+            row = self.db.execute(
+                "SELECT status FROM grades WHERE assignment_id = ? AND user_id = ? AND attempt = ? AND content_hash = ?",
+                self._key(assignment_id, submission)
+            ).fetchone()
+        return row[0] if row else None
+
+    def posted_grade(self, assignment_id, submission):
+        # (score, comments) posted for this exact attempt and content, or None
+        with self._lock:
+            row = self.db.execute(
+                "SELECT score, comments FROM grades WHERE assignment_id = ? AND user_id = ? AND attempt = ? "
+                "AND content_hash = ? AND status = ?",
+                self._key(assignment_id, submission) + (POSTED,)
+            ).fetchone()
+        return (row[0], json.loads(row[1])) if row else None
+
+    def record(self, assignment_id, results):
+        # Records the outcome of posting graded submissions in one transaction.
+        # results is a list of (submission, score, comments, posted).
+        now = time.time()
+        rows = []
+        for submission, score, comments, posted in results:
+            status = POSTED if posted else FAILED
+            next_retry_at = None if posted else now + RETRY_BASE_DELAY
+            rows.append(self._key(assignment_id, submission) + (
+                score, json.dumps(comments), now if posted else None, status, 0, next_retry_at
+            ))
+        with self._lock, self.db:
+            # A new attempt makes any failed post of an older one for the same student moot
+            self.db.executemany(
+                "UPDATE grades SET status = ? WHERE assignment_id = ? AND user_id = ? AND status = ?",
+                [(SUPERSEDED, assignment_id, row[1], FAILED) for row in rows]
+            )
+            self.db.executemany("INSERT OR REPLACE INTO grades VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+
+    def due_retries(self, assignment_id):
+        # Failed posts whose backoff has expired, as (user_id, attempt, content_hash, score, comments)
+        with self._lock:
+            rows = self.db.execute(
+                "SELECT user_id, attempt, content_hash, score, comments FROM grades "
+                "WHERE assignment_id = ? AND status = ? AND next_retry_at <= ?",
+                (assignment_id, FAILED, time.time())
+            ).fetchall()
+        return [(user_id, attempt, digest, score, json.loads(comments)) for user_id, attempt, digest, score, comments in rows]
+
+    def record_retries(self, assignment_id, results):
+        # results is a list of (user_id, attempt, content_hash, posted)
+        now = time.time()
+        with self._lock, self.db:
+            for user_id, attempt, digest, posted in results:
+                key = (assignment_id, user_id, attempt, digest)
+                if posted:
+                    self.db.execute(
+                        "UPDATE grades SET status = ?, posted_at = ?, next_retry_at = NULL "
+                        "WHERE assignment_id = ? AND user_id = ? AND attempt = ? AND content_hash = ?",
+                        (POSTED, now) + key
+                    )
+                    continue
+                retries = self.db.execute(
+                    "SELECT retries FROM grades WHERE assignment_id = ? AND user_id = ? AND attempt = ? AND content_hash = ?",
+                    key
+                ).fetchone()[0] + 1
+                delay = min(RETRY_BASE_DELAY * (2 ** retries), RETRY_MAX_DELAY)
+                logging.warning(f"Retry {retries} of grade post for user {user_id} failed, next attempt in {delay:.0f}s.")
+                self.db.execute(
+                    "UPDATE grades SET retries = ?, next_retry_at = ? "
+                    "WHERE assignment_id = ? AND user_id = ? AND attempt = ? AND content_hash = ?",
+                    (retries, now + delay) + key
+                )
@@ -0,0 +1,66 @@
+import html
+import re
+
+from bs4 import BeautifulSoup
+
+# Canvas' rich-text editor saves a construction file as one <p> per line, sometimes with
+# <span style=...>, <br>, <strong> and &nbsp; mixed in. extract_cf_text() turns that back
+# into plain CF shorthand: one line per block element, inline markup ignored, whitespace
+# (including non-breaking spaces) collapsed. Ordinary bodies go through a single regex
+# pass; anything unusual (comments, scripts, stray '<') is handed to BeautifulSoup.
+
+# Elements that end a line of text
+BLOCK_TAGS = frozenset({
+    'address', 'article', 'blockquote', 'br', 'dd', 'div', 'dl', 'dt', 'figcaption', 'figure',
+    'footer', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'header', 'hr', 'li', 'ol', 'p', 'pre',
+    'section', 'table', 'td', 'th', 'tr', 'ul',
+})
+
+# Characters that are invisible in the editor but would end up inside oligo names or sequences
+INVISIBLE = str.maketrans('', '', '\u200b\u200c\u200d\u2060\ufeff')
+
+TAG = re.compile(r'''<(/?)([a-zA-Z][a-zA-Z0-9:-]*)(?:[^<>"']|"[^"]*"|'[^']*')*>''')
+UNUSUAL = re.compile(r'<(?:!|\?|script|style|textarea|title)', re.IGNORECASE)
+
+
+def normalize_lines(text):
+    lines = (' '.join(line.translate(INVISIBLE).split()) for line in text.splitlines())
+    return '\n'.join(line for line in lines if line)
+
+
+def _fast_text(body):
+    # Plain text of a body with ordinary markup, or None if it needs a real parser
+    parts = []
+    position = 0
+    for match in TAG.finditer(body):
+        parts.append(body[position:match.start()])
+        if match.group(2).lower() in BLOCK_TAGS:
+            parts.append('\n')
+        position = match.end()
+    parts.append(body[position:])
+    text = ''.join(parts)
+    if '<' in text:
+        return None  # a '<' that isn't a well-formed tag
+    return html.unescape(text)
+
+
+def _soup_text(body):
+    soup = BeautifulSoup(body, 'html.parser')
+    for element in soup(['script', 'style', 'textarea', 'title']):
+        element.decompose()
+    for element in soup.find_all(BLOCK_TAGS):
+        element.insert_before('\n')
+        element.insert_after('\n')
+    return soup.get_text()
+
+
+def extract_cf_text(body):
+    # CF shorthand typed into a Canvas text-entry submission
+    if not isinstance(body, str):
+        # None (a submission without a text entry) is rejected by BeautifulSoup, as it always
+        # was, and graded as unparseable
+        return normalize_lines(_soup_text(body))
+    text = None if UNUSUAL.search(body) else _fast_text(body)
+    if text is None:
+        text = _soup_text(body)
+    return normalize_lines(text)
@@ -0,0 +1,22 @@
+from grading_scripts.rubric import load_plan
+from grading_scripts.sequence_search import RestrictionSiteIndex, ENZYME_SITES
+
+# Reference sequences for Design1, built once per process and shared read-only by every
+# submission graded in it. Nothing here may be modified by a grader.
+#
+# They are defined once, in rubrics/design1.yaml, and taken from its compiled plan so
+# grade_design1 and rubric:design1 always grade against the same sequences.
+_plan = load_plan('design1')
+
+# Template and backbone injected into each student's construction file
+template_sequence = _plan.sequences['ColE2']
+backbone_sequence = _plan.sequences['pBca9145-Bca1089']
+
+# Fragments the product plasmid must contain: ceaB, ceaB_with_restriction_sites, plasmid_backbone
+REFERENCE_FRAGMENTS = _plan.fragments
+
+# Changes whenever rubrics/design1.yaml does, so grade_design1's cached grades follow the spec
+CACHE_VERSION = _plan.cache_version
+
+# Every BioBrick/BglBrick site in a PCR product, found in one pass
+SITE_INDEX = RestrictionSiteIndex(ENZYME_SITES)
@@ -0,0 +1,99 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from metrics import METRICS
+
+# On-disk cache of grading results keyed by the construction file text, so resubmitted or
+# copied CFs are only simulated once. Shared by every grading worker process.
+CACHE_PATH = os.getenv('GRADE_CACHE_PATH', 'grade_cache.sqlite3')  # Empty to disable the cache
+MAX_ENTRIES = int(os.getenv('GRADE_CACHE_MAX_ENTRIES', '5000'))   # Least recently used results are evicted past this
+
+# A hit only rewrites its last_used time once it is this many seconds old, so lookups
+# are reads and grading processes don't queue for the write lock on every submission
+LAST_USED_RESOLUTION = 3600
+
+LOOKUPS = 'autograder_grade_cache_lookups_total'
+
+_local = threading.local()
+
+
+def normalize_cf(cf_shorthand):
+    # Whitespace differences (indentation, blank lines, tabs vs spaces) never change the grade
+    lines = (' '.join(line.split()) for line in cf_shorthand.splitlines())
+    return '\n'.join(line for line in lines if line)
+
+
+def cache_key(grader_name, grader_version, cf_shorthand):
+    text = f"{grader_name}\0{grader_version}\0{normalize_cf(cf_shorthand)}"
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def _connect():
+    # sqlite connections must not cross a fork or a thread, so each worker process and
+    # each thread opens its own
+    if getattr(_local, 'pid', None) != os.getpid():
+        _local.connection = sqlite3.connect(CACHE_PATH, timeout=30)
+        _local.pid = os.getpid()
+        connection = _local.connection
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            "key TEXT PRIMARY KEY, result TEXT NOT NULL, last_used REAL NOT NULL)"
+        )
+        connection.execute("CREATE INDEX IF NOT EXISTS results_last_used ON results (last_used)")
+        connection.commit()
+    return _local.connection
+
+
+def lookup(grader_name, grader_version, cf_shorthand):
+    # Returns the cached (score, comments) or None
+    if not CACHE_PATH:
+        return None
+    key = cache_key(grader_name, grader_version, cf_shorthand)
+    try:
+        db = _connect()
+        row = db.execute("SELECT result, last_used FROM results WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            METRICS.inc(LOOKUPS, result='miss')
+            return None
+        now = time.time()
+        if now - row[1] > LAST_USED_RESOLUTION:
+            with db:
+                db.execute("UPDATE results SET last_used = ? WHERE key = ?", (now, key))
+    except sqlite3.Error as e:
+        logging.error(f"Grade cache lookup failed: {e}")
+        return None
+    METRICS.inc(LOOKUPS, result='hit')
+    score, comments = json.loads(row[0])
+    return score, comments
+
+
+def store(grader_name, grader_version, cf_shorthand, score, comments):
+    if not CACHE_PATH:
+        return
+    key = cache_key(grader_name, grader_version, cf_shorthand)
+    try:
+        db = _connect()
+        with db:
+            db.execute(
+                "INSERT OR REPLACE INTO results VALUES (?, ?, ?)",
+                (key, json.dumps([score, comments]), time.time())
+            )
+            db.execute(
+                "DELETE FROM results WHERE key IN "
+                "(SELECT key FROM results ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (MAX_ENTRIES,)
+            )
+    except sqlite3.Error as e:
+        logging.error(f"Grade cache store failed: {e}")
+
+
+def stats():
+    # Returns (hits, misses) since this process started, counting the lookups grading
+    # workers report back with their metrics
+    return METRICS.value(LOOKUPS, result='hit'), METRICS.value(LOOKUPS, result='miss')
@@ -1,95 +1,125 @@
-from bs4 import BeautifulSoup
 from pydna_cf_simulator.parse_CF_shorthand import parse_CF_shorthand
-from pydna_cf_simulator.construction_file import ConstructionFile, PCR
-from pydna_cf_simulator.simulate_CF import simulate_CF
-from pydna_cf_simulator.polynucleotide import dsDNA, plasmid
+from pydna_cf_simulator.construction_file import PCR
+from grading_scripts import grade_cache
+from grading_scripts.cf_text import extract_cf_text
+from grading_scripts.simulation import Simulation
+from metrics import METRICS
+from grading_scripts.design1_fixtures import (
+    template_sequence, backbone_sequence, REFERENCE_FRAGMENTS, SITE_INDEX, CACHE_VERSION
+)
 import logging
 import json
 
+# Bump whenever the checks or their comments change so cached grades are not reused.
+# Edits to rubrics/design1.yaml change CACHE_VERSION and invalidate them too.
+GRADER_VERSION = '2'
+CACHE_KEY_VERSION = f"{GRADER_VERSION}-{CACHE_VERSION}"
+
 def grade(submission):
     comments = []
-    logging.debug(f"Starting to grade submission ID: {submission.get('id', 'Unknown')}")
+    logging.debug("Starting to grade submission ID: %s", submission.get('id', 'Unknown'))
 
     # Parse HTML and extract CF shorthand
     try:
-        logging.debug(f"Parsing HTML content for submission ID: {submission.get('id', 'Unknown')}")
-        soup = BeautifulSoup(submission['body'], 'html.parser')
-        cf_shorthand = soup.get_text(separator='\n').strip()  # Use '\n' as the separator
-        logging.debug(f"CF shorthand extracted for submission ID {submission.get('id', 'Unknown')}: {cf_shorthand}")
+        logging.debug("Parsing HTML content for submission ID: %s", submission.get('id', 'Unknown'))
+        with METRICS.time('html_parse'):
+            cf_shorthand = extract_cf_text(submission['body'])  # One line per paragraph, &nbsp; and extra spaces collapsed
+        logging.debug("CF shorthand extracted for submission ID %s: %s", submission.get('id', 'Unknown'), cf_shorthand)
     except Exception as e:
         error_msg = f"Error parsing HTML for submission ID {submission.get('id', 'Unknown')}: {e}"
         logging.error(error_msg)
         comments.append(error_msg)
         return 0, comments
 
+    # Identical construction files always get the same grade
+    with METRICS.time('cache_lookup'):
+        cached = grade_cache.lookup(__name__, CACHE_KEY_VERSION, cf_shorthand)
+    if cached is not None:
+        logging.info(f"Using cached grade for submission ID {submission.get('id', 'Unknown')}")
+        return cached
+
+    score, comments = grade_cf(cf_shorthand, submission.get('id', 'Unknown'))
+    grade_cache.store(__name__, CACHE_KEY_VERSION, cf_shorthand, score, comments)
+    return score, comments
+
+
+def grade_cf(cf_shorthand, submission_id):
+    # Comments must not mention the submission so cached results can be shared between students
+    comments = []
 
     # Parse CF shorthand
     try:
-        logging.debug(f"Attempting to parse CF shorthand for submission ID {submission.get('id', 'Unknown')}")
-        cf = parse_CF_shorthand(cf_shorthand)
-        logging.info(f"CF shorthand successfully parsed for submission ID {submission.get('id', 'Unknown')}")
+        logging.debug("Attempting to parse CF shorthand for submission ID %s", submission_id)
+        with METRICS.time('parse_cf'):
+            cf = parse_CF_shorthand(cf_shorthand)
+        logging.info(f"CF shorthand successfully parsed for submission ID {submission_id}")
     except Exception as e:
-        error_msg = f"Invalid CF shorthand format for submission ID {submission.get('id', 'Unknown')}: {e}"
-        logging.error(error_msg)
-        comments.append(error_msg)
+        logging.error(f"Invalid CF shorthand format for submission ID {submission_id}: {e}")
+        comments.append(f"Invalid CF shorthand format: {e}")
         return 0, comments
 
-    # Inject the template and backbone plasmids
-    template_sequence = dsDNA("atgagcggtggcgatggacgcggccataacacgggcgcgcatagcacaagtggtaacattaatggtggcccgaccgggcttggtgtaggtggtggtgcttctgatggctccggatggagttcggaaaataacccgtggggtggtggttccggtagcggcattcactggggtggtggttccggtcatggtaatggcggggggaatggtaattccggtggtggttcgggaacaggcggtaatctgtcagcagtagctgcgccagtggcatttggttttccggcactttccactccaggagctggcggtctggcggtcagtatttcagcgggagcattatcggcagctattgctgatattatggctgccctgaaaggaccgtttaaatttggtctttggggggtggctttatatggtgtattgccatcacaaatagcgaaagatgaccccaatatgatgtcaaagattgtgacgtcattacccgcagatgatattactgaatcacctgtcagttcattacctctcgataaggcaacagtaaacgtaaatgttcgtgttgttgatgatgtaaaagacgaacgacagaatatttcggttgtttcaggtgttccgatgagtgttccggtggttgatgcaaaacctaccgaacgtccaggtgtttttacggcatcaattccaggtgcacctgttctgaatatttcagttaataacagtacgccagaagtacagacattaagcccaggtgttacaaataatactgataaggatgttcgcccggcaggatttactcagggtggtaataccagggatgcagttattcgattcccgaaggacagcggtcataatgccgtatatgtttcagtgagtgatgttcttagtcctgaccaggtaaaacaacgtcaggatgaagaaaatcgccgtcagcaggaatgggatgctacgcatccggttgaagcggctgagcgaaattatgaacgcgcgcgtgcagagctgaatcaggcaaatgaagatgttgccagaaatcaggagcgacaggctaaagctgttcaggtttataattcgcgtaaaagcgaacttgatgcagcgaataaaactcttgctgatgcaatagctgaaataaaacaatttaatcgatttgcccatgacccaatggctggcggtcacagaatgtggcaaatggccggacttaaagctcagcgggcgcagacggatgtaaataataagcaggctgcatttgatgctgctgcaaaagagaagtcagatgctgatgctgcattaagtgccgcgcaggagcgccgcaaacagaaggaaaataaagaaaaggacgctaaggataaattagataaggagagtaaacggaataagccagggaaggcgacaggtaaaggtaaaccagttggtgataaatggctggatgatgcaggtaaagattcaggagcgccaattccagatcgcattgctgataagttgcgtgataaagaatttaaaaactttgacgatttccggaagaaattctgggaagaagtgtcaaaagatcccgatcttagtaagcaatttaaaggcagtaataagacgaacattcaaaagggaaaagcaccttttgcaaggaagaaagaccaagtaggtggtagggaacgctttgaattacatcatgataaaccaatcagtcaggatggtggtgtctatgatatgaataatatcagagtgaccacacctaagcgacatattgatattcatcggggtaagtaa")
-    backbone_sequence = plasmid("gaattcatgAGATCTatgagcggcttcccccgcagcgtcgtcgtcggcggcagcggggcggtgggcggcatgttcgccgggctgctgcgggaggcgggcagccgcacgctcgtcgtcgacctcgtaccgccgccgggacggccggacgcctgcctggtgggcgacgtcaccgcgccggggcccgaactcgcggccgccctccgggacgcggacctcgtcctgctcgccgtacacgaggacgtggccctcaaggccgtggcgcccgtgacccggctcatgcggccgggcgcgctgctcgccgacaccctgtccgtccggacgggcatggccgcggagctcgcggcccacgcccccggcgtccagcacgtgggcctcaacccgatgttcgcccccgccgccggcatgaccggccgacccgtggccgccgtggtcaccagggacgggccgggcgtcacggccctgctgcggctcgtcgagggcggcggcggcaggcccgtacggctcacggcggaggagcacgaccggacgacggcggccacccaggccctgacgcacgccgtgctcctctccttcgggctcgccctcgcccgcctcggcgtcgacgtccgggccctggcggcgacggcaccgccgccccaccaggtgctgctcgccctcctggcccgtgtgctcggcggcagccccgaggtgtacggggacatccagcggtccaacccccgggcggcgtccgcgcgccgggcgctcgccgaggccctgcgctccttcgccgcgctggtcggcgacgacccggaccgtgccgacgcccccgggcgcgccgacgcccccggccatcccgggggatgcgacggcgccgggaacctcgacggcgtcttcggggaactccgccggctcatgggaccggagctcgcggcgggccaggaccactgccaggagctgttccgcaccctccaccgcaccgacgacgaaggcgagaaggaccgatgaGGATCCtaaCTCGAGctgcaggcttcctcgctcactgactcgctgcgctcggtcgttcggctgcggcgagcggtatcagctcactcaaaggcggtaatacggttatccacagaatcaggggataacgcaggaaagaacatgtgagcaaaaggccagcaaaaggccaggaaccgtaaaaaggccgcgttgctggcgtttttccataggctccgcccccctgacgagcatcacaaaaatcgacgctcaagtcagaggtggcgaaacccgacaggactataaagataccaggcgtttccccctggaagctccctcgtgcgctctcctgttccgaccctgccgcttaccggatacctgtccgcctttctcccttcgggaagcgtggcgctttctcatagctcacgctgtaggtatctcagttcggtgtaggtcgttcgctccaagctgggctgtgtgcacgaaccccccgttcagcccgaccgctgcgccttatccggtaactatcgtcttgagtccaacccggtaagacacgacttatcgccactggcagcagccactggtaacaggattagcagagcgaggtatgtaggcggtgctacagagttcttgaagtggtggcctaactacggctacactagaaggacagtatttggtatctgcgctctgctgaagccagttaccttcggaaaaagagttggtagctcttgatccggcaaacaaaccaccgctggtagcggtggtttttttgtttgcaagcagcagattacgcgcagaaaaaaaggatctcaagaagatcctttgatcttttctacggggtctgacgctcagtggaacgaaaactcacgttaagggattttggtcatgagattatcaaaaaggatcttcacctagatccttttaaattaaaaatgaagttttaaatcaatctaaagtatatatgagtaaacttggtctgacagttaccaatgcttaatcagtgaggcacctatctcagcgatctgtctatttcgttcatccatagttgcctgactccccgtcgtgtagataactacgatacgggagggcttaccatctggccccagtgctgcaatgataccgcgagacccacgctcaccggctccagatttatcagcaataaaccagccagccggaagggccgagcgcagaagtggtcctgcaactttatccgcctccatccagtctattaattgttgccgggaagctagagtaagtagttcgccagttaatagtttgcgcaacgttgttgccattgctacaggcatcgtggtgtcacgctcgtcgtttggtatggcttcattcagctccggttcccaacgatcaaggcgagttacatgatcccccatgttgtgcaaaaaagcggttagctccttcggtcctccgatcgttgtcagaagtaagttggccgcagtgttatcactcatggttatggcagcactgcataattctcttactgtcatgccatccgtaagatgcttttctgtgactggtgagtactcaaccaagtcattctgagaatagtgtatgcggcgaccgagttgctcttgcccggcgtcaatacgggataataccgcgccacatagcagaactttaaaagtgctcatcattggaaaacgttcttcggggcgaaaactctcaaggatcttaccgctgttgagatccagttcgatgtaacccactcgtgcacccaactgatcttcagcatcttttactttcaccagcgtttctgggtgagcaaaaacaggaaggcaaaatgccgcaaaaaagggaataagggcgacacggaaatgttgaatactcatactcttcctttttcaatattattgaagcatttatcagggttattgtctcatgagcggatacatatttgaatgtatttagaaaaataaacaaataggggttccgcgcacatttccccgaaaagtgccacctgacgtctaagaaaccattattatcatgacattaacctataaaaataggcgtatcacgaggcagaatttcagataaaaaaaatccttagctttcgctaaggatgatttctg")
+    # Inject the template and backbone plasmids (shared fixtures, built once per process)
     cf.sequences["ColE2"] = template_sequence
     cf.sequences["pBca9145-Bca1089"] = backbone_sequence
 
+    # Products of every simulated step, shared by the checks so no step is simulated twice
+    simulation = Simulation(cf)
+
     # Check PCR step
     logging.debug("Checking PCR step")
-    score, pcr_product = check_pcr_step(cf, comments)
-    logging.debug(f"PCR step check completed with score: {score}")
+    score, pcr_product = check_pcr_step(cf, simulation, comments)
+    logging.debug("PCR step check completed with score: %s", score)
     if score != 5:
         return score, comments
 
+    # Locate every restriction site in the PCR product once for the sequence checks below
+    with METRICS.time('scan_sites'):
+        site_positions = SITE_INDEX.scan(pcr_product.sequence)
+
     # Check for restriction sites
     logging.debug("Checking for restriction sites")
-    score = check_restriction_sites(pcr_product, comments)
-    logging.debug(f"Restriction sites check completed with score: {score}")
+    score = check_restriction_sites(site_positions, comments)
+    logging.debug("Restriction sites check completed with score: %s", score)
     if score != 5:
         return score, comments
 
     # Check for biobricking
     logging.debug("Checking for biobricking")
-    score = check_biobricking(pcr_product, comments)
-    logging.debug(f"Biobricking check completed with score: {score}")
+    score = check_biobricking(site_positions, comments)
+    logging.debug("Biobricking check completed with score: %s", score)
     if score != 5:
         return score, comments
 
     # Check for 5' tails
     logging.debug("Checking for 5' tails")
-    score = check_5_prime_tails(pcr_product, comments)
-    logging.debug(f"5' tails check completed with score: {score}")
+    score = check_5_prime_tails(pcr_product, site_positions, comments)
+    logging.debug("5' tails check completed with score: %s", score)
     if score != 5:
         return score, comments
 
     # Simulate entire CF and check product
     logging.debug("Preparing to check simulated product")
     try:
-        score = check_simulated_product(cf, comments)
-        logging.debug(f"Product check completed with score: {score}")
+        score = check_simulated_product(cf, simulation, comments)
+        logging.debug("Product check completed with score: %s", score)
     except Exception as e:
         logging.error(f"Error during product check: {e}")
         comments.append(f"Error during product check: {e}")
         return 3, comments
 
-    logging.debug(f"Final score after all checks: {score}")
+    logging.debug("Final score after all checks: %s", score)
     return score, comments
 
 
 # Helper functions
 
-def check_pcr_step(cf, comments):
+@METRICS.time('check_pcr_step')
+def check_pcr_step(cf, simulation, comments):
     logging.debug("Checking PCR step in the construction file")
 
     # Find PCR steps in the construction file
     pcr_steps = [step for step in cf.steps if isinstance(step, PCR)]
-    logging.debug(f"Found {len(pcr_steps)} PCR steps")
+    logging.debug("Found %s PCR steps", len(pcr_steps))
 
     # Check for the number of PCR steps
     if len(pcr_steps) != 1:
@@ -100,15 +130,11 @@ def check_pcr_step(cf, comments):
 
     # Log details of the PCR step
     pcr_step = pcr_steps[0]
-    logging.debug(f"PCR Step: {pcr_step}")
+    logging.debug("PCR Step: %s", pcr_step)
 
-    # Create a new construction file with only the PCR step and the original sequences
-    new_cf = ConstructionFile([pcr_step], cf.sequences)
-    logging.debug("Created a new construction file with the PCR step and original sequences")
-
-    # Attempt to simulate the PCR step
+    # Attempt to simulate the PCR step on its own, from the original sequences
     try:
-        simulated_seqs = simulate_CF(new_cf)
+        simulated_seqs = simulation.run([pcr_step])
         success_msg = "PCR step successfully simulated."
         logging.info(success_msg)
         comments.append(success_msg)
@@ -120,20 +146,16 @@ def check_pcr_step(cf, comments):
         comments.append(error_msg)
         return 2, None  # Return 2 points if simulation fails
 
-def check_restriction_sites(pcr_product, comments):
+@METRICS.time('check_restriction_sites')
+def check_restriction_sites(site_positions, comments):
     logging.debug("Checking restriction sites in the PCR product")
     
     # Define the restriction sites to check
-    restriction_sites = {
-        "EcoRI": "GAATTC",
-        "BamHI": "GGATCC",
-        "BglII": "AGATCT",
-        "XhoI": "CTCGAG"
-    }
+    restriction_sites = ("EcoRI", "BamHI", "BglII", "XhoI")
 
     # Check for the presence of the restriction sites
-    sites_present = {site: (seq in pcr_product.sequence) for site, seq in restriction_sites.items()}
-    logging.debug(f"Restriction sites presence: {sites_present}")
+    sites_present = {site: bool(site_positions[site]) for site in restriction_sites}
+    logging.debug("Restriction sites presence: %s", sites_present)
 
     # Add comments based on the presence of restriction sites
     for site, present in sites_present.items():
@@ -150,17 +172,18 @@ def check_restriction_sites(pcr_product, comments):
         comments.append("Required pairs of restriction sites are missing.")
         return 3  # Deduct points if none of the pairs are present
     
-def check_biobricking(pcr_product, comments):
+@METRICS.time('check_biobricking')
+def check_biobricking(site_positions, comments):
     logging.debug("Checking biobricking")
     
     # Define the biobricking restriction sites
-    biobrick_sites = {"EcoRI": "GAATTC", "BglII": "AGATCT", "BamHI": "GGATCC", "XhoI": "CTCGAG"}
+    biobrick_sites = ("EcoRI", "BglII", "BamHI", "XhoI")
 
     # Check if the sites are present in order and only once
-    site_positions = {site: pcr_product.sequence.find(seq) for site, seq in biobrick_sites.items()}
-    logging.debug(f"Site positions: {site_positions}")
-    ordered_sites = sorted([(pos, site) for site, pos in site_positions.items() if pos != -1])
-    logging.debug(f"Ordered sites: {ordered_sites}")
+    first_positions = {site: site_positions[site][0] for site in biobrick_sites if site_positions[site]}
+    logging.debug("Site positions: %s", first_positions)
+    ordered_sites = sorted([(pos, site) for site, pos in first_positions.items()])
+    logging.debug("Ordered sites: %s", ordered_sites)
 
     # Check if they are in the correct order
     if ordered_sites == sorted(ordered_sites, key=lambda x: x[0]):
@@ -170,30 +193,29 @@ def check_biobricking(pcr_product, comments):
         return 4  # Deduct points if the order is incorrect
 
     # Check if there is more than one count of any site
-    if any(pcr_product.sequence.count(seq) > 1 for site, seq in biobrick_sites.items()):
+    if any(len(site_positions[site]) > 1 for site in biobrick_sites):
         comments.append("Multiple counts of a biobricking restriction site found.")
         return 4  # Deduct points for multiple counts
 
     comments.append("Biobricking check passed.")
     return 5  # Return full points if passed
 
-def check_5_prime_tails(pcr_product, comments):
+@METRICS.time('check_5_prime_tails')
+def check_5_prime_tails(pcr_product, site_positions, comments):
     logging.debug("Checking for 5' tails in the PCR product")
 
-    # Define the restriction sites and their sequences
-    restriction_sites = {
-        "EcoRI": "GAATTC", "BglII": "AGATCT", "BamHI": "GGATCC", "XhoI": "CTCGAG"
-    }
+    # Define the restriction sites to check
+    restriction_sites = ("EcoRI", "BglII", "BamHI", "XhoI")
 
     # Iterate over restriction sites to check for 5' tails
-    for site, sequence in restriction_sites.items():
-        index = pcr_product.sequence.find(sequence)
-        logging.debug(f"Checking 5' tail for {site}: Found at index {index}")
-
+    for site in restriction_sites:
         # Check if the restriction site is present
-        if index != -1:
+        if site_positions[site]:
+            index = site_positions[site][0]
+            logging.debug("Checking 5' tail for %s: Found at index %s", site, index)
+
             # Check for 5' tail
-            if index < 5 or (len(pcr_product.sequence) - (index + len(sequence))) < 5:
+            if index < 5 or (len(pcr_product.sequence) - (index + len(SITE_INDEX.sites[site]))) < 5:
                 comments.append(f"5' tail missing or insufficient for restriction site {site}.")
                 logging.warning(f"5' tail missing or insufficient for restriction site {site}.")
                 return 3  # Deduct points for missing 5' tail
@@ -204,12 +226,8 @@ def check_5_prime_tails(pcr_product, comments):
     logging.debug("All required 5' tails are present.")
     return 5  # Return full points if all 5' tails are present
 
-# Variables for sequences (to be provided)
-ceaB_sequence = "ATGAGCGGTGGCGATGGACGCGGCCATAACACGGGCGCGCATAGCACAAGTGGTAACATTAATGGTGGCCCGACCGGGCTTGGTGTAGGTGGTGGTGCTTCTGATGGCTCCGGATGGAGTTCGGAAAATAACCCGTGGGGTGGTGGTTCCGGTAGCGGCATTCACTGGGGTGGTGGTTCCGGTCATGGTAATGGCGGGGGGAATGGTAATTCCGGTGGTGGTTCGGGAACAGGCGGTAATCTGTCAGCAGTAGCTGCGCCAGTGGCATTTGGTTTTCCGGCACTTTCCACTCCAGGAGCTGGCGGTCTGGCGGTCAGTATTTCAGCGGGAGCATTATCGGCAGCTATTGCTGATATTATGGCTGCCCTGAAAGGACCGTTTAAATTTGGTCTTTGGGGGGTGGCTTTATATGGTGTATTGCCATCACAAATAGCGAAAGATGACCCCAATATGATGTCAAAGATTGTGACGTCATTACCCGCAGATGATATTACTGAATCACCTGTCAGTTCATTACCTCTCGATAAGGCAACAGTAAACGTAAATGTTCGTGTTGTTGATGATGTAAAAGACGAACGACAGAATATTTCGGTTGTTTCAGGTGTTCCGATGAGTGTTCCGGTGGTTGATGCAAAACCTACCGAACGTCCAGGTGTTTTTACGGCATCAATTCCAGGTGCACCTGTTCTGAATATTTCAGTTAATAACAGTACGCCAGAAGTACAGACATTAAGCCCAGGTGTTACAAATAATACTGATAAGGATGTTCGCCCGGCAGGATTTACTCAGGGTGGTAATACCAGGGATGCAGTTATTCGATTCCCGAAGGACAGCGGTCATAATGCCGTATATGTTTCAGTGAGTGATGTTCTTAGTCCTGACCAGGTAAAACAACGTCAGGATGAAGAAAATCGCCGTCAGCAGGAATGGGATGCTACGCATCCGGTTGAAGCGGCTGAGCGAAATTATGAACGCGCGCGTGCAGAGCTGAATCAGGCAAATGAAGATGTTGCCAGAAATCAGGAGCGACAGGCTAAAGCTGTTCAGGTTTATAATTCGCGTAAAAGCGAACTTGATGCAGCGAATAAAACTCTTGCTGATGCAATAGCTGAAATAAAACAATTTAATCGATTTGCCCATGACCCAATGGCTGGCGGTCACAGAATGTGGCAAATGGCCGGACTTAAAGCTCAGCGGGCGCAGACGGATGTAAATAATAAGCAGGCTGCATTTGATGCTGCTGCAAAAGAGAAGTCAGATGCTGATGCTGCATTAAGTGCCGCGCAGGAGCGCCGCAAACAGAAGGAAAATAAAGAAAAGGACGCTAAGGATAAATTAGATAAGGAGAGTAAACGGAATAAGCCAGGGAAGGCGACAGGTAAAGGTAAACCAGTTGGTGATAAATGGCTGGATGATGCAGGTAAAGATTCAGGAGCGCCAATTCCAGATCGCATTGCTGATAAGTTGCGTGATAAAGAATTTAAAAACTTTGACGATTTCCGGAAGAAATTCTGGGAAGAAGTGTCAAAAGATCCCGATCTTAGTAAGCAATTTAAAGGCAGTAATAAGACGAACATTCAAAAGGGAAAAGCACCTTTTGCAAGGAAGAAAGACCAAGTAGGTGGTAGGGAACGCTTTGAATTACATCATGATAAACCAATCAGTCAGGATGGTGGTGTCTATGATATGAATAATATCAGAGTGACCACACCTAAGCGACATATTGATATTCATCGGGGTAAGTAA"
-ceaB_with_restriction_sites = "GATCTATGAGCGGTGGCGATGGACGCGGCCATAACACGGGCGCGCATAGCACAAGTGGTAACATTAATGGTGGCCCGACCGGGCTTGGTGTAGGTGGTGGTGCTTCTGATGGCTCCGGATGGAGTTCGGAAAATAACCCGTGGGGTGGTGGTTCCGGTAGCGGCATTCACTGGGGTGGTGGTTCCGGTCATGGTAATGGCGGGGGGAATGGTAATTCCGGTGGTGGTTCGGGAACAGGCGGTAATCTGTCAGCAGTAGCTGCGCCAGTGGCATTTGGTTTTCCGGCACTTTCCACTCCAGGAGCTGGCGGTCTGGCGGTCAGTATTTCAGCGGGAGCATTATCGGCAGCTATTGCTGATATTATGGCTGCCCTGAAAGGACCGTTTAAATTTGGTCTTTGGGGGGTGGCTTTATATGGTGTATTGCCATCACAAATAGCGAAAGATGACCCCAATATGATGTCAAAGATTGTGACGTCATTACCCGCAGATGATATTACTGAATCACCTGTCAGTTCATTACCTCTCGATAAGGCAACAGTAAACGTAAATGTTCGTGTTGTTGATGATGTAAAAGACGAACGACAGAATATTTCGGTTGTTTCAGGTGTTCCGATGAGTGTTCCGGTGGTTGATGCAAAACCTACCGAACGTCCAGGTGTTTTTACGGCATCAATTCCAGGTGCACCTGTTCTGAATATTTCAGTTAATAACAGTACGCCAGAAGTACAGACATTAAGCCCAGGTGTTACAAATAATACTGATAAGGATGTTCGCCCGGCAGGATTTACTCAGGGTGGTAATACCAGGGATGCAGTTATTCGATTCCCGAAGGACAGCGGTCATAATGCCGTATATGTTTCAGTGAGTGATGTTCTTAGTCCTGACCAGGTAAAACAACGTCAGGATGAAGAAAATCGCCGTCAGCAGGAATGGGATGCTACGCATCCGGTTGAAGCGGCTGAGCGAAATTATGAACGCGCGCGTGCAGAGCTGAATCAGGCAAATGAAGATGTTGCCAGAAATCAGGAGCGACAGGCTAAAGCTGTTCAGGTTTATAATTCGCGTAAAAGCGAACTTGATGCAGCGAATAAAACTCTTGCTGATGCAATAGCTGAAATAAAACAATTTAATCGATTTGCCCATGACCCAATGGCTGGCGGTCACAGAATGTGGCAAATGGCCGGACTTAAAGCTCAGCGGGCGCAGACGGATGTAAATAATAAGCAGGCTGCATTTGATGCTGCTGCAAAAGAGAAGTCAGATGCTGATGCTGCATTAAGTGCCGCGCAGGAGCGCCGCAAACAGAAGGAAAATAAAGAAAAGGACGCTAAGGATAAATTAGATAAGGAGAGTAAACGGAATAAGCCAGGGAAGGCGACAGGTAAAGGTAAACCAGTTGGTGATAAATGGCTGGATGATGCAGGTAAAGATTCAGGAGCGCCAATTCCAGATCGCATTGCTGATAAGTTGCGTGATAAAGAATTTAAAAACTTTGACGATTTCCGGAAGAAATTCTGGGAAGAAGTGTCAAAAGATCCCGATCTTAGTAAGCAATTTAAAGGCAGTAATAAGACGAACATTCAAAAGGGAAAAGCACCTTTTGCAAGGAAGAAAGACCAAGTAGGTGGTAGGGAACGCTTTGAATTACATCATGATAAACCAATCAGTCAGGATGGTGGTGTCTATGATATGAATAATATCAGAGTGACCACACCTAAGCGACATATTGATATTCATCGGGGTAAGTAAGGATCC"
-plasmid_backbone_sequence = "GGATCCTAACTCGAGCTGCAGGCTTCCTCGCTCACTGACTCGCTGCGCTCGGTCGTTCGGCTGCGGCGAGCGGTATCAGCTCACTCAAAGGCGGTAATACGGTTATCCACAGAATCAGGGGATAACGCAGGAAAGAACATGTGAGCAAAAGGCCAGCAAAAGGCCAGGAACCGTAAAAAGGCCGCGTTGCTGGCGTTTTTCCATAGGCTCCGCCCCCCTGACGAGCATCACAAAAATCGACGCTCAAGTCAGAGGTGGCGAAACCCGACAGGACTATAAAGATACCAGGCGTTTCCCCCTGGAAGCTCCCTCGTGCGCTCTCCTGTTCCGACCCTGCCGCTTACCGGATACCTGTCCGCCTTTCTCCCTTCGGGAAGCGTGGCGCTTTCTCATAGCTCACGCTGTAGGTATCTCAGTTCGGTGTAGGTCGTTCGCTCCAAGCTGGGCTGTGTGCACGAACCCCCCGTTCAGCCCGACCGCTGCGCCTTATCCGGTAACTATCGTCTTGAGTCCAACCCGGTAAGACACGACTTATCGCCACTGGCAGCAGCCACTGGTAACAGGATTAGCAGAGCGAGGTATGTAGGCGGTGCTACAGAGTTCTTGAAGTGGTGGCCTAACTACGGCTACACTAGAAGGACAGTATTTGGTATCTGCGCTCTGCTGAAGCCAGTTACCTTCGGAAAAAGAGTTGGTAGCTCTTGATCCGGCAAACAAACCACCGCTGGTAGCGGTGGTTTTTTTGTTTGCAAGCAGCAGATTACGCGCAGAAAAAAAGGATCTCAAGAAGATCCTTTGATCTTTTCTACGGGGTCTGACGCTCAGTGGAACGAAAACTCACGTTAAGGGATTTTGGTCATGAGATTATCAAAAAGGATCTTCACCTAGATCCTTTTAAATTAAAAATGAAGTTTTAAATCAATCTAAAGTATATATGAGTAAACTTGGTCTGACAGTTACCAATGCTTAATCAGTGAGGCACCTATCTCAGCGATCTGTCTATTTCGTTCATCCATAGTTGCCTGACTCCCCGTCGTGTAGATAACTACGATACGGGAGGGCTTACCATCTGGCCCCAGTGCTGCAATGATACCGCGAGACCCACGCTCACCGGCTCCAGATTTATCAGCAATAAACCAGCCAGCCGGAAGGGCCGAGCGCAGAAGTGGTCCTGCAACTTTATCCGCCTCCATCCAGTCTATTAATTGTTGCCGGGAAGCTAGAGTAAGTAGTTCGCCAGTTAATAGTTTGCGCAACGTTGTTGCCATTGCTACAGGCATCGTGGTGTCACGCTCGTCGTTTGGTATGGCTTCATTCAGCTCCGGTTCCCAACGATCAAGGCGAGTTACATGATCCCCCATGTTGTGCAAAAAAGCGGTTAGCTCCTTCGGTCCTCCGATCGTTGTCAGAAGTAAGTTGGCCGCAGTGTTATCACTCATGGTTATGGCAGCACTGCATAATTCTCTTACTGTCATGCCATCCGTAAGATGCTTTTCTGTGACTGGTGAGTACTCAACCAAGTCATTCTGAGAATAGTGTATGCGGCGACCGAGTTGCTCTTGCCCGGCGTCAATACGGGATAATACCGCGCCACATAGCAGAACTTTAAAAGTGCTCATCATTGGAAAACGTTCTTCGGGGCGAAAACTCTCAAGGATCTTACCGCTGTTGAGATCCAGTTCGATGTAACCCACTCGTGCACCCAACTGATCTTCAGCATCTTTTACTTTCACCAGCGTTTCTGGGTGAGCAAAAACAGGAAGGCAAAATGCCGCAAAAAAGGGAATAAGGGCGACACGGAAATGTTGAATACTCATACTCTTCCTTTTTCAATATTATTGAAGCATTTATCAGGGTTATTGTCTCATGAGCGGATACATATTTGAATGTATTTAGAAAAATAAACAAATAGGGGTTCCGCGCACATTTCCCCGAAAAGTGCCACCTGACGTCTAAGAAACCATTATTATCATGACATTAACCTATAAAAATAGGCGTATCACGAGGCAGAATTTCAGATAAAAAAAATCCTTAGCTTTCGCTAAGGATGATTTCTGGAATTCATGA"
-
-def check_simulated_product(cf, comments):
+@METRICS.time('check_simulated_product')
+def check_simulated_product(cf, simulation, comments):
     # # Log the CF
     # try:
     #     cf_json = json.dumps(cf, default=lambda o: o.__dict__, sort_keys=True, indent=4)
@@ -219,27 +237,29 @@ def check_simulated_product(cf, comments):
 
     try:
         logging.debug("Attempting full CF simulation.")
-        seqs = simulate_CF(cf)
+        seqs = simulation.run(cf.steps)  # The PCR step is reused, not simulated again
         logging.debug("CF simulation successful.")
         comments.append("CF simulation successful. Checking product plasmid.")
 
         # Retrieve the name of the product plasmid from the last step
         product_plasmid_name = cf.steps[-1].output
         product_plasmid = seqs.get(product_plasmid_name, None)
-        logging.debug(f"Product plasmid: {product_plasmid}")
+        logging.debug("Product plasmid: %s", product_plasmid)
 
         if product_plasmid is None:
             comments.append(f"No product plasmid '{product_plasmid_name}' found.")
             return 3.5
 
-        # Perform checks on the product plasmid
-        if ceaB_sequence not in product_plasmid.sequence:
+        # Perform checks on the product plasmid, on either strand and across its origin
+        fragments_present = REFERENCE_FRAGMENTS.find(product_plasmid.sequence, circular=True)
+        logging.debug("Reference fragments in product plasmid: %s", fragments_present)
+        if 'ceaB' not in fragments_present:
             comments.append("Missing ceaB sequence in product plasmid.")
             return 3.5
-        if ceaB_with_restriction_sites not in product_plasmid.sequence:
+        if 'ceaB_with_restriction_sites' not in fragments_present:
             comments.append("Missing ceaB sequence with restriction sites in product plasmid.")
             return 3.5
-        if plasmid_backbone_sequence not in product_plasmid.sequence:
+        if 'plasmid_backbone' not in fragments_present:
             comments.append("Missing plasmid backbone sequence in product plasmid.")
             return 3.5
 
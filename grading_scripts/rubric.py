@@ -0,0 +1,341 @@
+import hashlib
+import json
+import logging
+import os
+
+from pydna_cf_simulator.parse_CF_shorthand import parse_CF_shorthand
+from pydna_cf_simulator.polynucleotide import dsDNA, plasmid
+from metrics import METRICS
+from grading_scripts import grade_cache
+from grading_scripts.cf_text import extract_cf_text
+from grading_scripts.sequence_search import FragmentMatcher, RestrictionSiteIndex, ENZYME_SITES
+from grading_scripts.simulation import Simulation
+
+# Declarative graders: a YAML or JSON spec in grading_scripts/rubrics/ describes an
+# assignment's reference sequences and its chain of checks, and compile_rubric() turns it
+# into a RubricPlan whose grade(submission) works like a hand-written grader's. Assignments
+# use one with 'grader': 'rubric:<spec name>'. See rubrics/design1.yaml for the format.
+#
+# Checks run in order. The first one that fails decides the score (its `points`); a
+# submission that passes them all gets the spec's `points`.
+
+RUBRIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'rubrics')
+RUBRIC_PREFIX = 'rubric:'
+
+SEQUENCE_TYPES = {'dsDNA': dsDNA, 'plasmid': plasmid}
+
+# Compiled plans of this process, keyed by spec name
+_plans = {}
+
+
+def find_spec(name):
+    for extension in ('.yaml', '.yml', '.json'):
+        path = os.path.join(RUBRIC_DIR, name + extension)
+        if os.path.exists(path):
+            return path
+    raise ValueError(f"No rubric named '{name}' in {RUBRIC_DIR}")
+
+
+def load_spec(path):
+    with open(path) as f:
+        text = f.read()
+    if path.endswith('.json'):
+        return json.loads(text), text
+    import yaml  # only needed for YAML specs
+    return yaml.safe_load(text), text
+
+
+def load_plan(name):
+    # The compiled plan for a spec name, compiled on first use and kept for the life of the process
+    plan = _plans.get(name)
+    if plan is None:
+        spec, text = load_spec(find_spec(name))
+        plan = _plans[name] = compile_rubric(spec, text)
+    return plan
+
+
+def compile_rubric(spec, text=None):
+    # Validates a spec and builds everything submissions share: reference sequences,
+    # fragment and site indexes, and the bound check chain
+    for field in ('name', 'points', 'checks'):
+        if field not in spec:
+            raise ValueError(f"Rubric spec is missing '{field}'")
+    return RubricPlan(spec, text if text is not None else json.dumps(spec, sort_keys=True))
+
+
+class RubricPlan:
+    def __init__(self, spec, text):
+        self.name = spec['name']
+        self.points = spec['points']
+        self.parse_error_points = spec.get('parse_error_points', 0)
+
+        # Cached grades are keyed on the exact spec text, so any edit regrades
+        self.cache_name = f"{RUBRIC_PREFIX}{self.name}"
+        self.cache_version = f"{spec.get('version', 1)}-{hashlib.sha256(text.encode('utf-8')).hexdigest()[:16]}"
+
+        self.sequences = {}
+        for name, entry in spec.get('sequences', {}).items():
+            kind = entry.get('type', 'dsDNA')
+            if kind not in SEQUENCE_TYPES:
+                raise ValueError(f"Rubric {self.name}: sequence {name} has unknown type '{kind}'")
+            self.sequences[name] = SEQUENCE_TYPES[kind](entry['sequence'])
+
+        fragments = spec.get('fragments', {})
+        self.fragment_descriptions = {name: entry.get('description', name) for name, entry in fragments.items()}
+        self.fragments = FragmentMatcher({name: entry['sequence'] for name, entry in fragments.items()}) if fragments else None
+
+        enzyme_sites = dict(ENZYME_SITES, **spec.get('enzymes', {}))
+        self.checks = []
+        produced = set()  # products of the simulate_step checks compiled so far
+        for entry in spec['checks']:
+            check = self._compile_check(entry, produced)
+            if check.kind == 'simulate_step':
+                produced.add(check.product)
+            self.checks.append(check)
+        used = {enzyme for check in self.checks for enzyme in check.enzymes}
+        unknown = used - set(enzyme_sites)
+        if unknown:
+            raise ValueError(f"Rubric {self.name}: unknown enzymes {sorted(unknown)}")
+        self.site_index = RestrictionSiteIndex({enzyme: enzyme_sites[enzyme] for enzyme in used}) if used else None
+
+    def _compile_check(self, entry, produced):
+        kind = entry.get('check')
+        if kind not in CHECKS:
+            raise ValueError(f"Rubric {self.name}: unknown check '{kind}'")
+        if kind in ('site_pairs', 'biobrick_sites', 'five_prime_tails') and entry.get('product') not in produced:
+            raise ValueError(f"Rubric {self.name}: {kind} check needs product '{entry.get('product')}' from an earlier simulate_step check")
+        if kind == 'product_fragments':
+            if self.fragments is None:
+                raise ValueError(f"Rubric {self.name}: product_fragments check needs a fragments section")
+            missing = [name for name in entry.get('fragments', []) if name not in self.fragment_descriptions]
+            if missing:
+                raise ValueError(f"Rubric {self.name}: fragments {missing} are not defined")
+        return CHECKS[kind](entry)
+
+    def grade(self, submission):
+        submission_id = submission.get('id', 'Unknown')
+        try:
+            with METRICS.time('html_parse'):
+                cf_shorthand = extract_cf_text(submission['body'])
+        except Exception as e:
+            error_msg = f"Error parsing HTML for submission ID {submission_id}: {e}"
+            logging.error(error_msg)
+            return 0, [error_msg]
+
+        with METRICS.time('cache_lookup'):
+            cached = grade_cache.lookup(self.cache_name, self.cache_version, cf_shorthand)
+        if cached is not None:
+            logging.info(f"Using cached grade for submission ID {submission_id}")
+            return cached
+
+        score, comments = self.grade_cf(cf_shorthand, submission_id)
+        grade_cache.store(self.cache_name, self.cache_version, cf_shorthand, score, comments)
+        return score, comments
+
+    def grade_cf(self, cf_shorthand, submission_id):
+        # Comments must not mention the submission so cached results can be shared between students
+        comments = []
+        try:
+            with METRICS.time('parse_cf'):
+                cf = parse_CF_shorthand(cf_shorthand)
+        except Exception as e:
+            logging.error(f"Invalid CF shorthand format for submission ID {submission_id}: {e}")
+            comments.append(f"Invalid CF shorthand format: {e}")
+            return self.parse_error_points, comments
+
+        cf.sequences.update(self.sequences)
+        context = GradingContext(self, cf)
+        for check in self.checks:
+            with METRICS.time(f"rubric_{check.kind}"):
+                score = check.run(context, comments)
+            if score is not None:
+                logging.debug("Rubric %s: %s failed with score %s", self.name, check.kind, score)
+                return score, comments
+        return self.points, comments
+
+
+class GradingContext:
+    # Per-submission state shared along the check chain
+    def __init__(self, plan, cf):
+        self.plan = plan
+        self.cf = cf
+        self.simulation = Simulation(cf)
+        self.products = {}        # product name given by a simulate_step check -> sequence
+        self._site_positions = {}
+
+    def site_positions(self, product):
+        positions = self._site_positions.get(product)
+        if positions is None:
+            positions = self._site_positions[product] = self.plan.site_index.scan(self.products[product].sequence)
+        return positions
+
+
+# Checks. run() appends comments and returns None when the check passes, or the score to give.
+
+class Check:
+    kind = None
+
+    def __init__(self, entry):
+        self.points = entry['points']
+        self.enzymes = []
+
+
+class StepCount(Check):
+    # The construction file has exactly `count` steps of a type (PCR, Digest, Ligate, ...)
+    kind = 'step_count'
+
+    def __init__(self, entry):
+        super().__init__(entry)
+        self.step = entry['step']
+        self.count = entry.get('count', 1)
+
+    def run(self, context, comments):
+        found = sum(1 for step in context.cf.steps if type(step).__name__ == self.step)
+        if found != self.count:
+            error_msg = f"Expected {self.count} {self.step} step{'' if self.count == 1 else 's'}, found {found}."
+            logging.error(error_msg)
+            comments.append(error_msg)
+            return self.points
+        return None
+
+
+class SimulateStep(Check):
+    # The first step of a type simulates on its own; its output becomes the named product
+    kind = 'simulate_step'
+
+    def __init__(self, entry):
+        super().__init__(entry)
+        self.step = entry['step']
+        self.product = entry['product']
+
+    def run(self, context, comments):
+        step = next((step for step in context.cf.steps if type(step).__name__ == self.step), None)
+        try:
+            if step is None:
+                raise ValueError(f"no {self.step} step")
+            context.products[self.product] = context.simulation.run([step])[step.output]
+        except Exception as e:
+            error_msg = f"{self.step} Step failed to simulate: {e}"
+            logging.error(error_msg)
+            comments.append(error_msg)
+            return self.points
+        success_msg = f"{self.step} step successfully simulated."
+        logging.info(success_msg)
+        comments.append(success_msg)
+        return None
+
+
+class SitePairs(Check):
+    # Reports each enzyme's site in a product; at least one of the pairs must be complete
+    kind = 'site_pairs'
+
+    def __init__(self, entry):
+        super().__init__(entry)
+        self.product = entry['product']
+        self.label = entry.get('label', 'PCR product')
+        self.enzymes = list(entry['enzymes'])
+        self.pairs = [list(pair) for pair in entry['pairs']]
+        self.enzymes += [enzyme for pair in self.pairs for enzyme in pair if enzyme not in self.enzymes]
+
+    def run(self, context, comments):
+        site_positions = context.site_positions(self.product)
+        for enzyme in self.enzymes:
+            state = 'present' if site_positions[enzyme] else 'missing'
+            comments.append(f"Restriction site {enzyme} is {state} in the {self.label}.")
+        if any(all(site_positions[enzyme] for enzyme in pair) for pair in self.pairs):
+            comments.append("Required pairs of restriction sites are present.")
+            return None
+        comments.append("Required pairs of restriction sites are missing.")
+        return self.points
+
+
+class BiobrickSites(Check):
+    # The enzymes' sites appear in `order` (if given) and no more than once each
+    kind = 'biobrick_sites'
+
+    def __init__(self, entry):
+        super().__init__(entry)
+        self.product = entry['product']
+        self.enzymes = list(entry['enzymes'])
+        self.order = list(entry.get('order', []))
+        self.enzymes += [enzyme for enzyme in self.order if enzyme not in self.enzymes]
+
+    def run(self, context, comments):
+        site_positions = context.site_positions(self.product)
+        present = [enzyme for enzyme in self.order if site_positions[enzyme]]
+        firsts = [site_positions[enzyme][0] for enzyme in present]
+        if firsts != sorted(firsts):
+            comments.append("Biobricking restriction sites are not in the correct order.")
+            return self.points
+        comments.append("Biobricking restriction sites are in the correct order.")
+
+        if any(len(site_positions[enzyme]) > 1 for enzyme in self.enzymes):
+            comments.append("Multiple counts of a biobricking restriction site found.")
+            return self.points
+        comments.append("Biobricking check passed.")
+        return None
+
+
+class FivePrimeTails(Check):
+    # Every enzyme site present in a product has at least `min_length` bases on either side
+    kind = 'five_prime_tails'
+
+    def __init__(self, entry):
+        super().__init__(entry)
+        self.product = entry['product']
+        self.enzymes = list(entry['enzymes'])
+        self.min_length = entry.get('min_length', 5)
+
+    def run(self, context, comments):
+        site_positions = context.site_positions(self.product)
+        length = len(context.products[self.product].sequence)
+        sites = context.plan.site_index.sites
+        for enzyme in self.enzymes:
+            if not site_positions[enzyme]:
+                continue
+            index = site_positions[enzyme][0]
+            if index < self.min_length or length - (index + len(sites[enzyme])) < self.min_length:
+                comments.append(f"5' tail missing or insufficient for restriction site {enzyme}.")
+                logging.warning(f"5' tail missing or insufficient for restriction site {enzyme}.")
+                return self.points
+            comments.append(f"5' tail present for restriction site {enzyme}.")
+            logging.info(f"5' tail present for restriction site {enzyme}.")
+        return None
+
+
+class ProductFragments(Check):
+    # The whole construction file simulates and its final product contains every fragment
+    kind = 'product_fragments'
+
+    def __init__(self, entry):
+        super().__init__(entry)
+        self.fragments = list(entry['fragments'])
+        self.circular = entry.get('circular', True)
+        self.simulation_error_points = entry.get('simulation_error_points', self.points)
+
+    def run(self, context, comments):
+        cf = context.cf
+        try:
+            products = context.simulation.run(cf.steps)
+        except Exception as e:
+            error_msg = f"CF simulation failed: {e}"
+            logging.error(error_msg)
+            comments.append(error_msg)
+            return self.simulation_error_points
+        comments.append("CF simulation successful. Checking product plasmid.")
+
+        product_name = cf.steps[-1].output if cf.steps else None
+        product = products.get(product_name)
+        if product is None:
+            comments.append(f"No product plasmid '{product_name}' found.")
+            return self.points
+
+        present = context.plan.fragments.find(product.sequence, circular=self.circular)
+        for name in self.fragments:
+            if name not in present:
+                comments.append(f"Missing {context.plan.fragment_descriptions[name]} in product plasmid.")
+                return self.points
+        return None
+
+
+CHECKS = {check.kind: check for check in (StepCount, SimulateStep, SitePairs, BiobrickSites, FivePrimeTails, ProductFragments)}
@@ -0,0 +1,90 @@
+import re
+
+COMPLEMENT = str.maketrans('ACGTNacgtn', 'TGCANtgcan')
+
+
+def reverse_complement(sequence):
+    return sequence.translate(COMPLEMENT)[::-1]
+
+
+class FragmentMatcher:
+    # Finds which of a fixed set of reference fragments occur in a sequence, on either
+    # strand and across the origin of circular sequences, in a single regex pass.
+    # Build it once at import; find() is safe to share between submissions.
+    def __init__(self, fragments):
+        self.fragments = {name: sequence.upper() for name, sequence in fragments.items()}
+        self.longest = max(len(sequence) for sequence in self.fragments.values())
+
+        # Every strand of every fragment is an alternative; longest first so that when two
+        # start at the same position the longer (more informative) one is the one reported
+        variants = set()
+        for sequence in self.fragments.values():
+            variants.add(sequence)
+            variants.add(reverse_complement(sequence))
+        ordered = sorted(variants, key=len, reverse=True)
+        self.pattern = re.compile('(?=(' + '|'.join(re.escape(variant) for variant in ordered) + '))')
+
+        # A hit on one variant also proves every fragment contained in it is present
+        self.implied = {
+            variant: frozenset(
+                name for name, sequence in self.fragments.items()
+                if sequence in variant or reverse_complement(sequence) in variant
+            )
+            for variant in ordered
+        }
+
+    def find(self, sequence, circular=False):
+        # Returns the names of the fragments present in sequence
+        text = sequence.upper()
+        if circular:
+            text += text[:self.longest - 1]
+        found = set()
+        for match in self.pattern.finditer(text):
+            found |= self.implied[match.group(1)]
+            if len(found) == len(self.fragments):
+                break
+        return found
+
+
+# Recognition sites of the BioBrick (EcoRI, XbaI, SpeI, PstI, NotI) and BglBrick
+# (EcoRI, BglII, BamHI, XhoI) enzymes
+ENZYME_SITES = {
+    "EcoRI": "GAATTC",
+    "XbaI": "TCTAGA",
+    "SpeI": "ACTAGT",
+    "PstI": "CTGCAG",
+    "NotI": "GCGGCCGC",
+    "BglII": "AGATCT",
+    "BamHI": "GGATCC",
+    "XhoI": "CTCGAG",
+}
+
+
+class RestrictionSiteIndex:
+    # Locates every occurrence of every enzyme site, on both strands, in one regex pass.
+    # Adding enzymes adds alternatives to the compiled pattern, not extra scans.
+    def __init__(self, sites=ENZYME_SITES):
+        self.sites = {enzyme: site.upper() for enzyme, site in sites.items()}
+
+        variants = {}
+        for enzyme, site in self.sites.items():
+            variants.setdefault(site, set()).add(enzyme)
+            variants.setdefault(reverse_complement(site), set()).add(enzyme)
+        ordered = sorted(variants, key=len, reverse=True)
+        self.pattern = re.compile('(?=(' + '|'.join(re.escape(variant) for variant in ordered) + '))')
+
+        # Only one alternative can match at a position, so a site that is a prefix of a
+        # longer one is credited whenever the longer one matches there
+        self.implied = {
+            variant: [enzyme for other in ordered if variant.startswith(other) for enzyme in variants[other]]
+            for variant in ordered
+        }
+
+    def scan(self, sequence):
+        # Returns {enzyme: [start positions]} for every enzyme in the index, sorted by position
+        positions = {enzyme: [] for enzyme in self.sites}
+        for match in self.pattern.finditer(sequence.upper()):
+            for enzyme in self.implied[match.group(1)]:
+                if not positions[enzyme] or positions[enzyme][-1] != match.start():
+                    positions[enzyme].append(match.start())
+        return positions
@@ -0,0 +1,32 @@
+from pydna_cf_simulator.construction_file import ConstructionFile
+from pydna_cf_simulator.simulate_CF import simulate_CF
+from metrics import METRICS
+
+
+class SubmissionTooExpensive(BaseException):
+    # Raised when a submission exhausts the memory it may use. A BaseException so the
+    # graders' broad `except Exception` handlers can't swallow it: it must reach the
+    # grading executor, which gives the submission a "too expensive to simulate" grade.
+    pass
+
+
+class Simulation:
+    # Simulates a construction file one step at a time, at most once per step, and keeps
+    # every intermediate product by name
+    def __init__(self, cf):
+        self.cf = cf
+        self.products = dict(cf.sequences)
+        self.simulated = set()  # ids of the steps already simulated
+
+    def run(self, steps):
+        for step in steps:
+            if id(step) in self.simulated:
+                continue
+            with METRICS.time('simulate_cf'):
+                try:
+                    self.products.update(simulate_CF(ConstructionFile([step], dict(self.products))))
+                except MemoryError:
+                    # Past the graders' `except Exception`, which would grade it as a failed step
+                    raise SubmissionTooExpensive()
+            self.simulated.add(id(step))
+        return self.products
@@ -0,0 +1,39 @@
+import time
+
+import pytest
+
+from grading_scripts import grade_design1
+from grading_scripts.cf_text import _fast_text, extract_cf_text
+
+
+def test_paragraphs_become_lines():
+    body = '<p>PCR&nbsp;ceaB-F ceaB-R ColE2 pcrpdt</p>\n<p>&nbsp;</p><p><span style="font-family: courier new;">oligo ceaB-F</span> aaaAGATCT</p>'
+    assert extract_cf_text(body) == "PCR ceaB-F ceaB-R ColE2 pcrpdt\noligo ceaB-F aaaAGATCT"
+
+
+def test_line_breaks_and_invisible_characters():
+    assert extract_cf_text("<div>Digest a<br/>Ligate&#8203; b</div>") == "Digest a\nLigate b"
+
+
+def test_unusual_markup_falls_back_to_parser():
+    body = "<!-- pasted --><p>oligo x <b>acgt</b></p><style>p {color: red}</style><p>1 < 2</p>"
+    assert extract_cf_text(body) == "oligo x acgt\n1 < 2"
+
+
+def test_unclosed_tags_take_linear_time():
+    # Each '<a' used to be matched against the whole rest of the body
+    started = time.perf_counter()
+    assert _fast_text('<a' * 32768) is None
+    assert time.perf_counter() - started < 1
+
+
+def test_missing_body_cannot_be_parsed():
+    with pytest.raises(TypeError):
+        extract_cf_text(None)
+    assert extract_cf_text('') == ''
+
+
+def test_missing_body_gets_no_points():
+    score, comments = grade_design1.grade({'id': 3, 'body': None})
+    assert score == 0
+    assert comments[-1].startswith("Error parsing HTML for submission ID 3: ")
@@ -1,4 +1,7 @@
-import grade_design1
+from grading_scripts import grade_design1  # Run from the repository root: python -m grading_scripts.test_design1
+from grading_scripts import grade_cache
+
+grade_cache.CACHE_PATH = ''  # always run the grader as it is now, never an old cached grade
 
 def test_grader1(cf_text):
     # Mock a submission object as it would be received from Canvas
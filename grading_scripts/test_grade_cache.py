@@ -0,0 +1,67 @@
+import threading
+
+import pytest
+
+from grading_scripts import grade_cache
+
+CF = "PCR ceaB-F ceaB-R ColE2 pcrpdt\n\nDigest pcrpdt BglII,XhoI 1 pcrdig"
+
+
+@pytest.fixture
+def clock(tmp_path, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(grade_cache, 'CACHE_PATH', str(tmp_path / 'cache.sqlite3'))
+    monkeypatch.setattr(grade_cache, '_local', threading.local())
+    monkeypatch.setattr(grade_cache.time, 'time', lambda: now[0])
+    return now
+
+
+def test_whitespace_variants_hit(clock):
+    grade_cache.store('grade_design1', '2', CF, 5, ['ok'])
+    hits, misses = grade_cache.stats()
+    variant = "  PCR  ceaB-F\tceaB-R ColE2 pcrpdt\nDigest pcrpdt   BglII,XhoI 1 pcrdig\n\n"
+    assert grade_cache.lookup('grade_design1', '2', variant) == (5, ['ok'])
+    assert grade_cache.stats() == (hits + 1, misses)
+
+
+def test_content_and_version_are_part_of_the_key(clock):
+    grade_cache.store('grade_design1', '2', CF, 5, ['ok'])
+    hits, misses = grade_cache.stats()
+    assert grade_cache.lookup('grade_design1', '2', CF.replace('XhoI', 'EcoRI')) is None
+    assert grade_cache.lookup('grade_design1', '3', CF) is None
+    assert grade_cache.lookup('other_grader', '2', CF) is None
+    assert grade_cache.stats() == (hits, misses + 3)
+
+
+def test_least_recently_used_entry_is_evicted(clock, monkeypatch):
+    monkeypatch.setattr(grade_cache, 'MAX_ENTRIES', 2)
+    grade_cache.store('g', '1', 'PCR a', 1, [])
+    clock[0] += 1
+    grade_cache.store('g', '1', 'PCR b', 2, [])
+    # Used again long enough after it was stored that the use is recorded
+    clock[0] += grade_cache.LAST_USED_RESOLUTION + 1
+    assert grade_cache.lookup('g', '1', 'PCR a') == (1, [])
+    clock[0] += 1
+    grade_cache.store('g', '1', 'PCR c', 3, [])
+    assert grade_cache.lookup('g', '1', 'PCR b') is None
+    assert grade_cache.lookup('g', '1', 'PCR a') == (1, [])
+    assert grade_cache.lookup('g', '1', 'PCR c') == (3, [])
+
+
+def test_recent_use_is_not_rewritten(clock, monkeypatch):
+    monkeypatch.setattr(grade_cache, 'MAX_ENTRIES', 2)
+    grade_cache.store('g', '1', 'PCR a', 1, [])
+    clock[0] += 1
+    grade_cache.store('g', '1', 'PCR b', 2, [])
+    # Within LAST_USED_RESOLUTION, so 'PCR a' keeps its store time and is still the oldest
+    clock[0] += 10
+    assert grade_cache.lookup('g', '1', 'PCR a') == (1, [])
+    grade_cache.store('g', '1', 'PCR c', 3, [])
+    assert grade_cache.lookup('g', '1', 'PCR a') is None
+    assert grade_cache.lookup('g', '1', 'PCR b') == (2, [])
+
+
+def test_disabled_cache_stores_nothing(clock, monkeypatch):
+    monkeypatch.setattr(grade_cache, 'CACHE_PATH', '')
+    grade_cache.store('g', '1', 'PCR a', 1, [])
+    assert grade_cache.lookup('g', '1', 'PCR a') is None
@@ -0,0 +1,105 @@
+import pytest
+
+from grading_scripts import grade_design1
+from grading_scripts.rubric import compile_rubric, load_plan
+
+# The answer key; ColE2 and pBca9145-Bca1089 are added by the graders
+ANSWER = """
+PCR ceaB-F ceaB-R ColE2 pcrpdt
+Digest pcrpdt BglII,XhoI 1 pcrdig
+Digest pBca9145-Bca1089 BglII,XhoI 1 vectdig
+Ligate pcrdig vectdig pBca9145-ceaB
+
+oligo ceaB-F ccaaaAGATCTatgagcggtggcgatggacg
+oligo ceaB-R gctagCTCGAGttaGGATCCttacttaccccgatgaatatc
+"""
+
+FORWARD = "oligo ceaB-F ccaaaAGATCTatgagcggtggcgatggacg"
+REVERSE = "oligo ceaB-R gctagCTCGAGttaGGATCCttacttaccccgatgaatatc"
+
+# The answer key and one way of failing each check
+DESIGN1_VARIANTS = {
+    'answer': ANSWER,
+    'unparseable': "PCR ceaB-F ceaB-R\nLigate",
+    'two_pcr_steps': ANSWER.replace("Digest pcrpdt", "PCR ceaB-F ceaB-R ColE2 pcrpdt2\nDigest pcrpdt", 1),
+    'unknown_template': ANSWER.replace("PCR ceaB-F ceaB-R ColE2 pcrpdt", "PCR ceaB-F ceaB-R pUC19 pcrpdt"),
+    'no_site_pair': ANSWER.replace(FORWARD, "oligo ceaB-F ccaaaatgagcggtggcgatggacg"),
+    'sites_out_of_order': ANSWER.replace(FORWARD, "oligo ceaB-F ccaaaCTCGAGatgagcggtggcgatggacg").replace(
+        REVERSE, "oligo ceaB-R gctagAGATCTttaGGATCCttacttaccccgatgaatatc"),
+    'no_5_prime_tail': ANSWER.replace(FORWARD, "oligo ceaB-F AGATCTatgagcggtggcgatggacg"),
+    'wrong_digest': ANSWER.replace("Digest pcrpdt BglII,XhoI", "Digest pcrpdt BamHI,XhoI"),
+    'missing_ligation': ANSWER.replace("Ligate pcrdig vectdig pBca9145-ceaB", "Ligate vectdig vectdig pBca9145-ceaB"),
+}
+
+
+@pytest.mark.parametrize('name', sorted(DESIGN1_VARIANTS))
+def test_design1_rubric_matches_grade_design1(name):
+    cf_shorthand = DESIGN1_VARIANTS[name]
+    expected = grade_design1.grade_cf(cf_shorthand, name)
+    assert load_plan('design1').grade_cf(cf_shorthand, name) == expected
+
+
+SIMULATE_PCR = {'check': 'simulate_step', 'step': 'PCR', 'product': 'p', 'points': 1}
+
+
+def spec(**changes):
+    base = {
+        'name': 'tiny',
+        'points': 5,
+        'fragments': {'insert': {'sequence': 'ATGAAACCCGGGTTT'}},
+        'checks': [
+            {'check': 'step_count', 'step': 'PCR', 'points': 1},
+            {'check': 'product_fragments', 'fragments': ['insert'], 'points': 2},
+        ],
+    }
+    base.update(changes)
+    return base
+
+
+def test_compile_rubric_accepts_valid_spec():
+    plan = compile_rubric(spec())
+    assert [check.kind for check in plan.checks] == ['step_count', 'product_fragments']
+
+
+def test_compile_rubric_rejects_unknown_check():
+    with pytest.raises(ValueError, match="unknown check 'spellcheck'"):
+        compile_rubric(spec(checks=[{'check': 'spellcheck', 'points': 0}]))
+
+
+def test_compile_rubric_rejects_unknown_enzyme():
+    check = {'check': 'site_pairs', 'product': 'p', 'enzymes': ['EcoRI', 'Frobnase'], 'pairs': [], 'points': 0}
+    with pytest.raises(ValueError, match="unknown enzymes \\['Frobnase'\\]"):
+        compile_rubric(spec(checks=[SIMULATE_PCR, check]))
+
+
+def test_compile_rubric_rejects_product_not_simulated_first():
+    check = {'check': 'biobrick_sites', 'product': 'p', 'enzymes': ['EcoRI'], 'points': 0}
+    with pytest.raises(ValueError, match="biobrick_sites check needs product 'p' from an earlier simulate_step"):
+        compile_rubric(spec(checks=[check, SIMULATE_PCR]))
+    with pytest.raises(ValueError, match="five_prime_tails check needs product 'q'"):
+        compile_rubric(spec(checks=[SIMULATE_PCR, dict(check, check='five_prime_tails', product='q')]))
+    compile_rubric(spec(checks=[SIMULATE_PCR, check]))
+
+
+def test_compile_rubric_rejects_product_fragments_without_fragments():
+    no_fragments = spec()
+    del no_fragments['fragments']
+    with pytest.raises(ValueError, match="product_fragments check needs a fragments section"):
+        compile_rubric(no_fragments)
+
+
+def test_grade_design1_cache_follows_the_spec():
+    assert grade_design1.CACHE_KEY_VERSION == f"{grade_design1.GRADER_VERSION}-{load_plan('design1').cache_version}"
+
+
+def test_compile_rubric_rejects_undefined_fragment():
+    check = {'check': 'product_fragments', 'fragments': ['insert', 'terminator'], 'points': 0}
+    with pytest.raises(ValueError, match="fragments \\['terminator'\\] are not defined"):
+        compile_rubric(spec(checks=[check]))
+
+
+def test_compile_rubric_requires_points():
+    incomplete = spec()
+    del incomplete['points']
+    with pytest.raises(ValueError, match="missing 'points'"):
+        compile_rubric(incomplete)
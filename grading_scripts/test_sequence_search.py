@@ -0,0 +1,24 @@
+from grading_scripts.sequence_search import FragmentMatcher, RestrictionSiteIndex, reverse_complement
+
+
+def test_site_index_finds_every_occurrence():
+    index = RestrictionSiteIndex({"EcoRI": "GAATTC", "BsaI": "GGTCTC", "NotI": "GCGGCCGC"})
+    positions = index.scan("ccGAATTCaaGGTCTCaaGAGACCttgcggccgcGAATTC")
+    assert positions["EcoRI"] == [2, 34]
+    assert positions["BsaI"] == [10, 18]  # forward and reverse strand
+    assert positions["NotI"] == [26]
+
+
+def test_site_index_credits_prefix_sites():
+    index = RestrictionSiteIndex({"Short": "GCGGCC", "NotI": "GCGGCCGC"})
+    positions = index.scan("aaGCGGCCGCaa")
+    assert positions["Short"] == [2, 4]  # its reverse complement GGCCGC starts at 4
+    assert positions["NotI"] == [2]
+
+
+def test_fragment_matcher_strands_and_origin():
+    matcher = FragmentMatcher({"insert": "ATGAAACCCGGGTTT", "short": "CCCGGG"})
+    assert matcher.find("ggATGAAACCCGGGTTTgg") == {"insert", "short"}
+    assert matcher.find(reverse_complement("ggATGAAACCCGGGTTTgg")) == {"insert", "short"}
+    assert matcher.find("CCCGGGTTTccATGAAA") == {"short"}
+    assert matcher.find("CCCGGGTTTccATGAAA", circular=True) == {"insert", "short"}
@@ -0,0 +1,204 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from local_server import LocalServer, QuietHandler
+
+# Upper bounds in seconds of the latency histogram buckets (Prometheus-style, cumulative on export)
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+STAGE_SECONDS = 'autograder_stage_seconds'
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+class Metrics:
+    # Counters and latency histograms for one process, keyed by metric name and labels.
+    # Grading workers drain() theirs after each submission and the parent merge()s them,
+    # so the parent's copy covers the whole autograder. Safe to share between threads.
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        # Also run in every forked child: the lock may have been held by another thread at
+        # fork time, and the parent's numbers must not be reported back to it a second time
+        self._lock = threading.Lock()
+        self.counters = {}    # (name, labels) -> value
+        self.histograms = {}  # (name, labels) -> [count per bucket..., overflow, total count, total seconds]
+
+    def inc(self, name, amount=1, **labels):
+        key = _key(name, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def observe(self, name, seconds, **labels):
+        key = _key(name, labels)
+        bucket = next((i for i, bound in enumerate(LATENCY_BUCKETS) if seconds <= bound), len(LATENCY_BUCKETS))
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = [0] * (len(LATENCY_BUCKETS) + 1) + [0, 0.0]
+            histogram[bucket] += 1
+            histogram[-2] += 1
+            histogram[-1] += seconds
+
+    def value(self, name, **labels):
+        # Current value of one counter, 0 if it was never incremented
+        key = _key(name, labels)
+        with self._lock:
+            return self.counters.get(key, 0)
+
+    @contextmanager
+    def time(self, stage):
+        # Times a block (or, used as a decorator, a function) as one grading-loop stage
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(STAGE_SECONDS, time.perf_counter() - started, stage=stage)
+
+    # Moving metrics between processes
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'counters': dict(self.counters),
+                'histograms': {key: list(histogram) for key, histogram in self.histograms.items()},
+            }
+
+    def drain(self):
+        # Everything recorded since the last drain, cleared afterwards
+        with self._lock:
+            drained = {'counters': self.counters, 'histograms': self.histograms}
+            self.counters, self.histograms = {}, {}
+        return drained
+
+    def merge(self, snapshot):
+        if not snapshot:
+            return
+        with self._lock:
+            for key, value in snapshot['counters'].items():
+                self.counters[key] = self.counters.get(key, 0) + value
+            for key, other in snapshot['histograms'].items():
+                histogram = self.histograms.get(key)
+                if histogram is None:
+                    self.histograms[key] = list(other)
+                else:
+                    self.histograms[key] = [mine + theirs for mine, theirs in zip(histogram, other)]
+
+    def stage_totals(self):
+        # {stage: (count, seconds)} for every timed stage so far
+        with self._lock:
+            return {
+                dict(labels)['stage']: (histogram[-2], histogram[-1])
+                for (name, labels), histogram in self.histograms.items() if name == STAGE_SECONDS
+            }
+
+    # Export
+
+    def to_prometheus(self):
+        snapshot = self.snapshot()
+        lines = []
+        typed = set()
+        for (name, labels), value in sorted(snapshot['counters'].items()):
+            if name not in typed:
+                lines.append(f"# TYPE {name} counter")
+                typed.add(name)
+            lines.append(f"{name}{_format_labels(labels)} {value}")
+        for (name, labels), histogram in sorted(snapshot['histograms'].items()):
+            if name not in typed:
+                lines.append(f"# TYPE {name} histogram")
+                typed.add(name)
+            cumulative = 0
+            for bound, count in zip(LATENCY_BUCKETS, histogram):
+                cumulative += count
+                lines.append(f"{name}_bucket{_format_labels(labels, [('le', bound)])} {cumulative}")
+            lines.append(f"{name}_bucket{_format_labels(labels, [('le', '+Inf')])} {histogram[-2]}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {histogram[-1]}")
+            lines.append(f"{name}_count{_format_labels(labels)} {histogram[-2]}")
+        return '\n'.join(lines) + '\n'
+
+    def to_json(self):
+        snapshot = self.snapshot()
+        return json.dumps({
+            'counters': [
+                {'name': name, 'labels': dict(labels), 'value': value}
+                for (name, labels), value in sorted(snapshot['counters'].items())
+            ],
+            'histograms': [
+                {
+                    'name': name, 'labels': dict(labels),
+                    'buckets': dict(zip([str(bound) for bound in LATENCY_BUCKETS] + ['+Inf'], histogram[:-2])),
+                    'count': histogram[-2], 'sum': histogram[-1],
+                }
+                for (name, labels), histogram in sorted(snapshot['histograms'].items())
+            ],
+        }, indent=2)
+
+    def write(self, path):
+        # Prometheus text for a .prom file (e.g. for node_exporter's textfile collector), JSON otherwise
+        text = self.to_prometheus() if path.endswith('.prom') else self.to_json()
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+
+
+def format_stage_summary(before, after):
+    # One line of per-stage counts and mean latencies between two stage_totals() results
+    parts = []
+    for stage, (count, seconds) in sorted(after.items()):
+        count -= before.get(stage, (0, 0.0))[0]
+        seconds -= before.get(stage, (0, 0.0))[1]
+        if count:
+            parts.append(f"{stage} {count}x {seconds / count * 1000:.1f}ms")
+    return ', '.join(parts)
+
+
+# The metrics of this process; graders, the Canvas client and the pipeline all record here
+METRICS = Metrics()
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=METRICS.reset)
+
+
+class MetricsServer(LocalServer):
+    # Local read-only endpoint for scraping:
+    #     curl http://127.0.0.1:<port>/metrics          (Prometheus text format)
+    #     curl http://127.0.0.1:<port>/metrics.json
+    name = 'metrics'
+
+    def __init__(self, metrics, port, host='127.0.0.1'):
+        self.metrics = metrics
+        super().__init__(port, host)
+
+    def _handler_class(self):
+        metrics = self.metrics
+
+        class Handler(QuietHandler):
+            def do_GET(self):
+                if self.path.rstrip('/') == '/metrics':
+                    body, content_type = metrics.to_prometheus(), 'text/plain; version=0.0.4'
+                elif self.path.rstrip('/') == '/metrics.json':
+                    body, content_type = metrics.to_json(), 'application/json'
+                else:
+                    return self.send_empty(404)
+                body = body.encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        return Handler
@@ -0,0 +1,189 @@
+import logging
+import queue
+import threading
+
+from grading_executor import PARENT_GRACE_SECONDS
+from grading_ledger import POSTED, FAILED
+from metrics import METRICS
+
+_DONE = object()  # end-of-stream marker passed between stages
+
+
+class AssignmentPipeline:
+    # Streams one assignment's submissions through three stages joined by bounded queues:
+    #
+    #     fetch (thread) --pages--> grade (caller's thread) --jobs--> post (thread)
+    #
+    # Grading starts on the first page while later pages download, and grades are posted
+    # as soon as they're ready: in bulk while results are backing up, immediately when the
+    # queue runs dry. Memory is bounded by the queue depths, not by the class size.
+    def __init__(self, assignment, pages, store, ledger, executor, post_grades, depth=4, chunk_size=50):
+        # pages yields lists of submissions; post_grades(list of (user_id, score, comments))
+        # returns {user_id: success}
+        self.assignment = assignment
+        self.pages = pages
+        self.store = store
+        self.ledger = ledger
+        self.executor = executor
+        self.post_grades = post_grades
+        self.chunk_size = max(chunk_size, 1)
+        self.page_queue = queue.Queue(maxsize=depth)
+        self.job_queue = queue.Queue(maxsize=max(depth, executor.max_workers * 2))
+        # Generous bound on how long the oldest queued job can take, even if every job ahead
+        # of it in the shared pool runs to its timeout; only a wedged worker exceeds it
+        self.result_timeout = (self.job_queue.maxsize + 1) * executor.timeout + PARENT_GRACE_SECONDS
+        self._stopped = threading.Event()
+        self.seen = []          # (id, submitted_at) of every fetched submission, for the cursor
+        self.fetch_failed = False
+        self.fetched_all = False  # the fetch stage reached the last page
+        self.listed_all = False   # and grading got through every page before it
+        self.graded = 0
+
+    def run(self):
+        # Returns how many submissions were sent for grading
+        fetcher = threading.Thread(target=self._fetch, name=f"fetch-{self.assignment['id']}")
+        poster = threading.Thread(target=self._post, name=f"post-{self.assignment['id']}")
+        fetcher.start()
+        poster.start()
+        try:
+            self._grade()
+        finally:
+            self._put(self.job_queue, _DONE, force=True)
+            poster.join()
+            self._stopped.set()
+            self._drain(self.page_queue)
+            fetcher.join()
+
+        # Only a pass that saw every submission may move the cursor past them
+        if self.store and self.listed_all:
+            self.store.advance(self.assignment['id'], self.seen)
+        if self.store:
+            self.store.save()
+        return self.graded
+
+    def _put(self, q, item, force=False):
+        # Blocking put that gives up once the pipeline is stopping (unless forced)
+        while force or not self._stopped.is_set():
+            try:
+                q.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    @staticmethod
+    def _drain(q):
+        while True:
+            try:
+                q.get_nowait()
+            except queue.Empty:
+                return
+
+    # Stages
+
+    def _fetch(self):
+        try:
+            pages = iter(self.pages)
+            while True:
+                with METRICS.time('fetch_page'):
+                    page = next(pages, _DONE)
+                if page is _DONE:
+                    self.fetched_all = True
+                    return
+                if not self._put(self.page_queue, page):
+                    return
+        except Exception as e:
+            logging.error(f"Failed to retrieve submissions for assignment {self.assignment['name']}: {e}")
+            self.fetch_failed = True  # a partial listing must not move the cursor forward
+        finally:
+            # Even when stopping: grading may be waiting for a page. run() drains the queue,
+            # so this can't block for good.
+            self._put(self.page_queue, _DONE, force=True)
+
+    def _grade(self):
+        while True:
+            page = self.page_queue.get()
+            if page is _DONE:
+                # Also sent when the pipeline stops, before the last page
+                self.listed_all = self.fetched_all
+                return
+            for submission in page:
+                self.seen.append({'id': submission['id'], 'submitted_at': submission.get('submitted_at')})
+                if not self._should_grade(submission):
+                    continue
+                logging.info(f"Grading submission from user {submission['user_id']} for assignment {self.assignment['name']}.")
+                job = self.executor.submit(self.assignment['grader'], submission)
+                if not self._put(self.job_queue, (submission, job)):
+                    return
+                self.graded += 1
+
+    def _should_grade(self, submission):
+        assignment_id = self.assignment['id']
+        user_id = submission['user_id']
+        submission_state = submission['workflow_state']
+        logging.debug("Submission from user %s is in '%s' state.", user_id, submission_state)
+
+        if submission_state != 'submitted':
+            logging.debug("Skipping non-submitted submission from user %s in state '%s'.", user_id, submission_state)
+            METRICS.inc('autograder_submissions_skipped_total', reason='not_submitted')
+            return False
+
+        if self.store and self.store.is_processed(assignment_id, submission):
+            logging.debug("Skipping already processed submission from user %s.", user_id)
+            METRICS.inc('autograder_submissions_skipped_total', reason='processed')
+            return False
+
+        ledger_status = self.ledger.status(assignment_id, submission)
+        if ledger_status == POSTED:
+            logging.debug("Skipping submission from user %s, its grade was already posted.", user_id)
+            METRICS.inc('autograder_submissions_skipped_total', reason='posted')
+            if self.store:
+                self.store.mark_processed(assignment_id, submission)
+            return False
+        if ledger_status == FAILED:
+            logging.debug("Skipping submission from user %s, its grade post is queued for retry.", user_id)
+            METRICS.inc('autograder_submissions_skipped_total', reason='retry_pending')
+            return False
+        return True
+
+    def _post(self):
+        ready = []
+        try:
+            while True:
+                item = self.job_queue.get()
+                if item is _DONE:
+                    break
+                submission, job = item
+                score, comment = self.executor.result(submission, job, wait_timeout=self.result_timeout)
+                if score < 0:
+                    logging.warning(f"Submission from user {submission['user_id']} cannot be graded. Comment: {comment}")
+                else:
+                    logging.info(f"Updating submission for user {submission['user_id']} with score {score} and comment: {comment}")
+                    ready.append((submission, score, comment))
+                if len(ready) >= self.chunk_size or (ready and self.job_queue.empty()):
+                    self._flush(ready)
+                    ready = []
+            self._flush(ready)
+        except Exception as e:
+            logging.critical(f"Unexpected error while posting grades for assignment {self.assignment['name']}: {e}")
+            self._stopped.set()
+            self._drain(self.job_queue)
+
+    def _flush(self, ready):
+        if not ready:
+            return
+        assignment_id = self.assignment['id']
+        with METRICS.time('post_grades'):
+            results = self.post_grades([(submission['user_id'], score, comment) for submission, score, comment in ready])
+        posted = sum(1 for submission, _, _ in ready if results.get(submission['user_id']))
+        METRICS.inc('autograder_grades_posted_total', posted, result='success')
+        METRICS.inc('autograder_grades_posted_total', len(ready) - posted, result='failure')
+        self.ledger.record(assignment_id, [
+            (submission, score, comment, bool(results.get(submission['user_id'])))
+            for submission, score, comment in ready
+        ])
+        for submission, _, _ in ready:
+            if not results.get(submission['user_id']):
+                logging.error(f"Failed to update submission for user {submission['user_id']}, queued for retry.")
+            elif self.store:
+                self.store.mark_processed(assignment_id, submission)
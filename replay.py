@@ -0,0 +1,187 @@
+import argparse
+import difflib
+import gzip
+import json
+import os
+import sys
+import time
+
+# Record an assignment's submissions once, then regrade them offline as often as needed:
+#
+#     python replay.py record 8685248                      # -> snapshots/8685248-<time>.jsonl.gz
+#     python replay.py replay snapshots/8685248-....jsonl.gz [--grader rubric:design1]
+#
+# A snapshot is gzipped JSONL: a header line describing the assignment, then one
+# submission per line with the grade that was last posted for it under 'previous'.
+# Replaying grades every submission on local worker processes and prints how the scores
+# and comments differ from the posted ones. It never contacts Canvas and posts nothing.
+
+SNAPSHOT_FORMAT = 1
+
+
+def write_snapshot(path, header, submissions):
+    # Returns how many submissions were written
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    count = 0
+    tmp_path = f"{path}.tmp"
+    with gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+        f.write(json.dumps(dict(header, snapshot=SNAPSHOT_FORMAT)) + '\n')
+        for submission in submissions:
+            f.write(json.dumps(submission) + '\n')
+            count += 1
+    os.replace(tmp_path, path)
+    return count
+
+
+def read_snapshot(path):
+    # Returns (header, submissions)
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        header = json.loads(f.readline())
+        if header.get('snapshot') != SNAPSHOT_FORMAT:
+            raise ValueError(f"{path} is not a snapshot this version can read")
+        return header, [json.loads(line) for line in f if line.strip()]
+
+
+def previous_grade(submission, ledger, assignment_id):
+    # What the autograder last posted: the ledger's exact record if it has one, otherwise
+    # the Canvas score and the newest submission comment
+    posted = ledger.posted_grade(assignment_id, submission) if ledger else None
+    if posted is not None:
+        return {'score': posted[0], 'comments': posted[1], 'source': 'ledger'}
+    if submission.get('score') is None:
+        return None
+    comments = submission.get('submission_comments') or []
+    text = comments[-1].get('comment', '') if comments else ''
+    return {'score': submission['score'], 'comments': text.split('\n') if text else [], 'source': 'canvas'}
+
+
+def record(args):
+    import Main
+    from canvas_client import CanvasError
+    from grading_ledger import GradingLedger
+
+    assignment = next((a for a in Main.ASSIGNMENTS if a['id'] == args.assignment_id), None)
+    header = {
+        'course_id': Main.COURSE_ID,
+        'assignment_id': args.assignment_id,
+        'assignment_name': assignment['name'] if assignment else str(args.assignment_id),
+        'grader': args.grader or (assignment['grader'] if assignment else None),
+        'recorded_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+    }
+    output = args.output or os.path.join('snapshots', f"{args.assignment_id}-{time.strftime('%Y%m%d-%H%M%S')}.jsonl.gz")
+    ledger = GradingLedger(Main.LEDGER_PATH) if os.path.exists(Main.LEDGER_PATH) else None
+
+    def submissions():
+        pages = Main.canvas.iter_submission_pages(
+            Main.COURSE_ID, args.assignment_id, prefetch=Main.CANVAS_WORKERS, include=['submission_comments']
+        )
+        for page in pages:
+            for submission in page:
+                if not submission.get('body'):
+                    continue  # nothing was submitted
+                submission['previous'] = previous_grade(submission, ledger, args.assignment_id)
+                submission.pop('submission_comments', None)
+                yield submission
+
+    try:
+        count = write_snapshot(output, header, submissions())
+    except CanvasError as e:
+        sys.exit(f"Could not record assignment {args.assignment_id}: {e}")
+    finally:
+        Main.canvas.close()
+    print(f"Recorded {count} submissions of {header['assignment_name']} to {output}")
+
+
+def compare(submission, score, comments):
+    # None if the new grade matches the previous one, else a description of the change
+    previous = submission.get('previous')
+    if previous is None:
+        return {'change': 'new', 'score': score}
+    if previous['score'] is not None and float(previous['score']) == float(score) and previous['comments'] == comments:
+        return None
+    return {
+        'change': 'score' if previous['score'] is None or float(previous['score']) != float(score) else 'comments',
+        'previous_score': previous['score'],
+        'score': score,
+        'comment_diff': list(difflib.unified_diff(previous['comments'], comments, 'posted', 'regraded', lineterm='', n=0)),
+    }
+
+
+def replay(args):
+    header, submissions = read_snapshot(args.snapshot)
+    grader = args.grader or header.get('grader')
+    if not grader:
+        sys.exit("The snapshot doesn't name a grader; pass --grader.")
+    if not args.cache:
+        # A grader change must not be answered from old results. Set in the environment
+        # before anything imports grade_cache, so spawned workers read it too.
+        os.environ['GRADE_CACHE_PATH'] = ''
+
+    from grading_executor import GradingExecutor
+
+    executor = GradingExecutor([grader], max_workers=args.workers or None, timeout=args.timeout)
+    started = time.perf_counter()
+    try:
+        results = executor.grade(grader, submissions)
+    finally:
+        executor.shutdown()
+    elapsed = time.perf_counter() - started
+
+    changes = []
+    for submission, (score, comments) in zip(submissions, results):
+        change = compare(submission, score, comments)
+        if change is not None:
+            changes.append(dict(change, user_id=submission['user_id'], submission_id=submission['id'],
+                                ungradeable=score < 0))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            for change in changes:
+                f.write(json.dumps(change) + '\n')
+
+    for change in changes:
+        who = f"user {change['user_id']} (submission {change['submission_id']})"
+        if change['change'] == 'new':
+            print(f"{who}: no posted grade, now {change['score']}")
+            continue
+        print(f"{who}: {change['previous_score']} -> {change['score']}")
+        if args.verbose:
+            for line in change['comment_diff'][2:]:
+                print(f"    {line}")
+
+    counts = {kind: sum(1 for change in changes if change['change'] == kind) for kind in ('score', 'comments', 'new')}
+    print(
+        f"Regraded {len(submissions)} submissions of {header['assignment_name']} with {grader} in {elapsed:.1f}s: "
+        f"{len(submissions) - len(changes)} unchanged, {counts['score']} score changes, "
+        f"{counts['comments']} comment-only changes, {counts['new']} never posted."
+    )
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Record Canvas submissions and regrade them offline.")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    record_parser = commands.add_parser('record', help="download an assignment's submissions to a snapshot")
+    record_parser.add_argument('assignment_id', type=int)
+    record_parser.add_argument('--output', help="snapshot path (default snapshots/<assignment>-<time>.jsonl.gz)")
+    record_parser.add_argument('--grader', help="grader stored in the snapshot (default: the assignment's in Main.py)")
+
+    replay_parser = commands.add_parser('replay', help="regrade a snapshot locally and diff against the posted grades")
+    replay_parser.add_argument('snapshot')
+    replay_parser.add_argument('--grader', help="grader to use instead of the one recorded in the snapshot")
+    replay_parser.add_argument('--workers', type=int, default=0, help="grading processes (default one per CPU core)")
+    replay_parser.add_argument('--timeout', type=int, default=120, help="seconds one submission may take to grade")
+    replay_parser.add_argument('--cache', action='store_true', help="reuse and fill the grade cache")
+    replay_parser.add_argument('--output', help="also write the changes as JSONL to this file")
+    replay_parser.add_argument('-v', '--verbose', action='store_true', help="show how the comments changed")
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    arguments = parse_args()
+    if arguments.command == 'record':
+        record(arguments)
+    else:
+        replay(arguments)
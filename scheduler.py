@@ -0,0 +1,165 @@
+import logging
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+from local_server import LocalServer, QuietHandler
+from submission_store import parse_timestamp
+
+# Poll intervals in seconds
+MIN_INTERVAL = 30        # around a deadline or during a burst of submissions
+DEFAULT_INTERVAL = 300   # an open assignment with nothing special going on
+LATE_INTERVAL = 900      # past due (late submissions are still possible)
+IDLE_INTERVAL = 3600     # locked: only retries and regrades can show up
+
+NEAR_DEADLINE = timedelta(hours=2)   # poll at MIN_INTERVAL this close to due_at, either side
+DEADLINE_DAY = timedelta(hours=24)   # poll twice as often on the last day before due_at
+LATE_GRACE = timedelta(days=1)       # keep polling normally this long after due_at/lock_at
+INFO_REFRESH = 3600                  # seconds between refreshes of an assignment's dates
+
+
+def _timestamp(value):
+    try:
+        return parse_timestamp(value) if value else None
+    except ValueError:
+        return None
+
+
+def base_interval(info, now):
+    # Poll interval implied by an assignment's due_at/lock_at dates alone
+    due_at = _timestamp(info.get('due_at'))
+    lock_at = _timestamp(info.get('lock_at'))
+
+    if lock_at and now > lock_at + LATE_GRACE:
+        return IDLE_INTERVAL
+    if due_at:
+        until_due = due_at - now
+        if -NEAR_DEADLINE <= until_due <= NEAR_DEADLINE:
+            return MIN_INTERVAL
+        if timedelta(0) < until_due <= DEADLINE_DAY:
+            return DEFAULT_INTERVAL // 2
+        if until_due < -LATE_GRACE:
+            return LATE_INTERVAL
+    return DEFAULT_INTERVAL
+
+
+class AssignmentSchedule:
+    def __init__(self, assignment):
+        self.assignment = assignment
+        self.info = {}
+        self.info_fetched_at = None
+        self.interval = DEFAULT_INTERVAL
+        self.next_run_at = 0.0  # run as soon as the scheduler starts
+        self.running = False
+        self.rerun = False  # triggered while running: go again right after
+
+    def update(self, new_submissions, now):
+        # Halve the interval while submissions keep arriving, drift back to the date-based
+        # interval when they stop
+        base = base_interval(self.info, datetime.now(timezone.utc))
+        if new_submissions:
+            self.interval = max(MIN_INTERVAL, min(base, self.interval / 2))
+        else:
+            self.interval = min(base, max(self.interval * 1.5, MIN_INTERVAL))
+        self.next_run_at = now + self.interval
+
+
+class Scheduler:
+    # Runs each assignment on its own adaptive interval, several at once, and can be asked
+    # to run one (or all) immediately with trigger().
+    #
+    # run_assignment(assignment) grades one assignment and returns how many new submissions
+    # it found; get_assignment_info(assignment) returns its Canvas record (due_at, lock_at).
+    def __init__(self, assignments, run_assignment, get_assignment_info=None, max_workers=None):
+        self.schedules = [AssignmentSchedule(assignment) for assignment in assignments]
+        self.run_assignment = run_assignment
+        self.get_assignment_info = get_assignment_info
+        self.pool = ThreadPoolExecutor(max_workers=max_workers or max(len(assignments), 1), thread_name_prefix='assignment')
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = False
+
+    def trigger(self, assignment_id=None):
+        # Schedules an immediate pass for one assignment, or for all of them
+        with self._lock:
+            matched = False
+            for schedule in self.schedules:
+                if assignment_id is None or schedule.assignment['id'] == assignment_id:
+                    schedule.next_run_at = 0.0
+                    schedule.rerun = schedule.running
+                    matched = True
+        self._wake.set()
+        return matched
+
+    def stop(self):
+        self._stopped = True
+        self._wake.set()
+        self.pool.shutdown(wait=True)
+
+    def run_forever(self):
+        while not self._stopped:
+            self._wake.clear()
+            now = time.monotonic()
+            with self._lock:
+                for schedule in self.schedules:
+                    if not schedule.running and schedule.next_run_at <= now:
+                        schedule.running = True
+                        self.pool.submit(self._run, schedule)
+                waiting = [schedule.next_run_at for schedule in self.schedules if not schedule.running]
+            self._wake.wait(timeout=max(min(waiting) - now, 0.0) if waiting else None)
+
+    def _refresh_info(self, schedule):
+        if self.get_assignment_info is None:
+            return
+        if schedule.info_fetched_at is not None and time.monotonic() - schedule.info_fetched_at < INFO_REFRESH:
+            return
+        info = self.get_assignment_info(schedule.assignment)
+        if info is not None:
+            schedule.info = info
+            schedule.info_fetched_at = time.monotonic()
+
+    def _run(self, schedule):
+        assignment = schedule.assignment
+        new_submissions = 0
+        try:
+            self._refresh_info(schedule)
+            new_submissions = self.run_assignment(assignment) or 0
+        except Exception as e:
+            logging.critical(f"Unexpected error while processing assignment {assignment['name']}: {e}")
+        finally:
+            with self._lock:
+                schedule.update(new_submissions, time.monotonic())
+                if schedule.rerun:
+                    schedule.next_run_at = 0.0
+                    schedule.rerun = False
+                schedule.running = False
+            logging.info(f"Next pass for assignment {assignment['name']} in {schedule.interval:.0f} seconds.")
+            self._wake.set()
+
+
+class TriggerServer(LocalServer):
+    # Local endpoint for requesting an immediate pass, e.g. from a Canvas webhook relay or cron:
+    #     curl -X POST http://127.0.0.1:<port>/trigger            (every assignment)
+    #     curl -X POST http://127.0.0.1:<port>/trigger/<id>       (one assignment)
+    name = 'grading triggers'
+
+    def __init__(self, scheduler, port, host='127.0.0.1'):
+        self.scheduler = scheduler
+        super().__init__(port, host)
+
+    def _handler_class(self):
+        scheduler = self.scheduler
+
+        class Handler(QuietHandler):
+            def do_POST(self):
+                match = re.fullmatch(r'/trigger(?:/(\d+))?/?', self.path)
+                if not match:
+                    return self.send_empty(404)
+                assignment_id = int(match.group(1)) if match.group(1) else None
+                found = scheduler.trigger(assignment_id)
+                logging.info(f"Triggered immediate pass for {'assignment ' + str(assignment_id) if assignment_id else 'all assignments'}.")
+                self.send_empty(202 if found else 404)
+
+        return Handler
@@ -0,0 +1,105 @@
+import json
+import logging
+import os
+import threading
+from datetime import datetime, timedelta, timezone
+
+# Canvas timestamps look like 2024-02-01T17:04:12Z
+TIMESTAMP_FORMAT = '%Y-%m-%dT%H:%M:%SZ'
+
+# Re-ask Canvas for a small window before the cursor so clock skew or an exclusive
+# `submitted_since` comparison can never drop a submission. Anything in the window
+# that was already handled is filtered out by the processed map.
+CURSOR_OVERLAP = timedelta(minutes=5)
+
+
+def parse_timestamp(timestamp):
+    return datetime.strptime(timestamp, TIMESTAMP_FORMAT).replace(tzinfo=timezone.utc)
+
+
+def format_timestamp(moment):
+    return moment.astimezone(timezone.utc).strftime(TIMESTAMP_FORMAT)
+
+
+class SubmissionCursorStore:
+    # Per-assignment high-water mark for incremental fetching, kept in a JSON file:
+    # {
+    #     "<assignment_id>": {
+    #         "cursor": "<oldest submitted_at we still need to see>",
+    #         "processed": {"<submission_id>": "<submitted_at that was graded>"}
+    #     }
+    # }
+    # Safe to share between threads processing different assignments.
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.RLock()
+        self.state = self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logging.error(f"Could not read submission cursor store {self.path}, starting from scratch: {e}")
+            return {}
+
+    def save(self):
+        # Write to a temporary file first so a crash never leaves a truncated store behind
+        with self._lock:
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(self.state, f, indent=2, sort_keys=True)
+            os.replace(tmp_path, self.path)
+
+    def _assignment_state(self, assignment_id):
+        with self._lock:
+            return self.state.setdefault(str(assignment_id), {'cursor': None, 'processed': {}})
+
+    def get_since(self, assignment_id):
+        # Timestamp to pass to Canvas as `submitted_since`, or None for a full first fetch
+        cursor = self._assignment_state(assignment_id)['cursor']
+        if cursor is None:
+            return None
+        return format_timestamp(parse_timestamp(cursor) - CURSOR_OVERLAP)
+
+    def is_processed(self, assignment_id, submission):
+        processed = self._assignment_state(assignment_id)['processed']
+        return processed.get(str(submission['id'])) == submission.get('submitted_at')
+
+    def mark_processed(self, assignment_id, submission):
+        with self._lock:
+            processed = self._assignment_state(assignment_id)['processed']
+            processed[str(submission['id'])] = submission.get('submitted_at')
+
+    def advance(self, assignment_id, submissions):
+        # Move the cursor up to the oldest submission that still needs work (e.g. its grade
+        # failed to post), or to the newest one seen if everything was handled.
+        with self._lock:
+            self._advance(assignment_id, submissions)
+
+    def _advance(self, assignment_id, submissions):
+        state = self._assignment_state(assignment_id)
+        seen = [s['submitted_at'] for s in submissions if s.get('submitted_at')]
+        pending = [s['submitted_at'] for s in submissions
+                   if s.get('submitted_at') and not self.is_processed(assignment_id, s)]
+
+        if pending:
+            new_cursor = min(pending)
+        elif seen:
+            new_cursor = max(seen + [state['cursor']] if state['cursor'] else seen)
+        else:
+            new_cursor = state['cursor']
+
+        if new_cursor != state['cursor']:
+            logging.debug("Advancing submission cursor for assignment %s from %s to %s", assignment_id, state['cursor'], new_cursor)
+        state['cursor'] = new_cursor
+
+        # Forget processed submissions that fall before the fetch window; Canvas won't return them again
+        if new_cursor:
+            oldest_kept = format_timestamp(parse_timestamp(new_cursor) - CURSOR_OVERLAP)
+            state['processed'] = {
+                submission_id: submitted_at for submission_id, submitted_at in state['processed'].items()
+                if submitted_at and submitted_at >= oldest_kept
+            }
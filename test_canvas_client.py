@@ -0,0 +1,98 @@
+import pytest
+
+from benchmarks.fake_canvas import FakeCanvas
+from canvas_client import CanvasClient, CanvasError, RATE_LIMIT_MAX_DELAY, RATE_LIMIT_FLOOR
+
+COURSE_ID = 1
+ASSIGNMENT_ID = 5
+
+
+def make_submissions(count):
+    return [
+        {'id': i, 'user_id': 1000 + i, 'workflow_state': 'submitted', 'body': f'<p>{i}</p>',
+         'submitted_at': f"2024-02-01T10:{i // 60:02d}:{i % 60:02d}Z"}
+        for i in range(count)
+    ]
+
+
+@pytest.fixture
+def canvas():
+    fake = FakeCanvas(COURSE_ID, {ASSIGNMENT_ID: make_submissions(95)}, page_size=10, seed=1).start()
+    yield fake
+    fake.stop()
+
+
+@pytest.fixture
+def client(canvas):
+    client = CanvasClient(canvas.url, 'token', max_workers=4, max_retries=10)
+    client.delays = []
+    client._delay_all = client.delays.append  # record backoffs instead of sleeping through them
+    yield client
+    client.close()
+
+
+def test_prefetched_pages_arrive_in_order_despite_throttling(canvas, client):
+    canvas.throttle_rate = 0.3
+    pages = list(client.iter_submission_pages(COURSE_ID, ASSIGNMENT_ID, prefetch=4))
+    assert [len(page) for page in pages] == [10] * 9 + [5]
+    assert [s['id'] for page in pages for s in page] == list(range(95))
+    assert canvas.throttled > 0
+    assert len(client.delays) == canvas.throttled
+
+
+def test_throttled_request_waits_for_retry_after(canvas, client):
+    canvas.throttle_rate = 1.0
+    canvas.retry_after = '7'
+    client.max_retries = 2
+    response = client.get(client.url(f"courses/{COURSE_ID}/assignments/{ASSIGNMENT_ID}"))
+    assert response.status_code == 429
+    assert client.delays == [7.0, 7.0]
+    assert canvas.requests[('GET', 'assignment')] == 3
+
+
+def test_low_rate_limit_bucket_spaces_requests(canvas, client):
+    canvas.rate_limit_remaining = 15.0
+    client.get(client.url(f"courses/{COURSE_ID}/assignments/{ASSIGNMENT_ID}"))
+    assert client.delays == [pytest.approx(RATE_LIMIT_MAX_DELAY * (1 - 15.0 / RATE_LIMIT_FLOOR))]
+
+    client.delays.clear()
+    canvas.rate_limit_remaining = 700.0
+    client.get(client.url(f"courses/{COURSE_ID}/assignments/{ASSIGNMENT_ID}"))
+    assert client.delays == []
+
+
+def test_iter_pages_raises_canvas_error(client):
+    with pytest.raises(CanvasError):
+        list(client.iter_pages(client.url(f"courses/{COURSE_ID}/nonexistent")))
+
+
+def test_get_is_retried_after_server_error(canvas, client):
+    canvas.server_errors = 2
+    assert client.get_assignment(COURSE_ID, ASSIGNMENT_ID) == {'id': ASSIGNMENT_ID}
+    assert canvas.requests[('GET', 'assignment')] == 3
+
+
+def test_grade_post_is_not_repeated_after_server_error(canvas, client):
+    # Canvas may have applied it anyway; a retry could add the comment twice
+    canvas.server_errors = 1
+    assert client.update_submission(COURSE_ID, ASSIGNMENT_ID, 1000, 5, ['ok']) is False
+    assert canvas.requests[('PUT', 'submission')] == 1
+    assert canvas.posted_grades == {}
+
+
+def test_throttled_grade_post_is_retried(canvas, client):
+    canvas.throttle_rate = 1.0
+    client.max_retries = 1
+    assert client.update_submission(COURSE_ID, ASSIGNMENT_ID, 1000, 5, ['ok']) is False
+    assert canvas.requests[('PUT', 'submission')] == 2
+
+    canvas.throttle_rate = 0.0
+    assert client.update_submission(COURSE_ID, ASSIGNMENT_ID, 1000, 5, ['ok', 'done']) is True
+    assert canvas.posted_grades[(ASSIGNMENT_ID, 1000)] == (5, 'ok\ndone')
+
+
+def test_unreachable_server_is_retried_for_posts(client):
+    client.base_url = 'http://127.0.0.1:1/api/v1/'
+    client.max_retries = 2
+    assert client.update_submission(COURSE_ID, ASSIGNMENT_ID, 1000, 5, ['ok']) is False
+    assert len(client.delays) == 2
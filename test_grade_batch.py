@@ -0,0 +1,100 @@
+from grade_batch import GradeBatch
+
+
+class StubClient:
+    # Records what GradeBatch sends. A bulk job reports the states in `progress_states`
+    # and, before it does, applies the grades of the students in `applies`.
+    def __init__(self, progress_states=('completed',), applies=None, current_grades=True):
+        self.progress_states = list(progress_states)
+        self.applies = applies
+        self.current_grades = current_grades
+        self.bulk_calls = []
+        self.individual = []
+        self.polls = 0
+        self.canvas = {}  # user_id -> (score, comment) as "Canvas" has them
+
+    def bulk_update_grades(self, course_id, assignment_id, grades):
+        self.bulk_calls.append([user_id for user_id, _, _ in grades])
+        for user_id, score, comments in grades:
+            if self.applies is None or user_id in self.applies:
+                self.canvas[user_id] = (score, '\n'.join(comments))
+        return {'id': len(self.bulk_calls), 'workflow_state': 'queued'}
+
+    def get_progress(self, progress_id):
+        self.polls += 1
+        state = self.progress_states.pop(0) if len(self.progress_states) > 1 else self.progress_states[0]
+        return {'id': progress_id, 'workflow_state': state}
+
+    def get_current_grades(self, course_id, assignment_id, user_ids):
+        if not self.current_grades:
+            return None
+        return {user_id: self.canvas[user_id] for user_id in user_ids if user_id in self.canvas}
+
+    def update_submissions(self, course_id, assignment_id, grades):
+        self.individual.extend(user_id for user_id, _, _ in grades)
+        for user_id, score, comments in grades:
+            self.canvas[user_id] = (score, '\n'.join(comments))
+        return {user_id: True for user_id, _, _ in grades}
+
+
+def batch(client, count, chunk_size=3, **kwargs):
+    grades = GradeBatch(client, 1, 5, chunk_size=chunk_size, poll_interval=0.001, **kwargs)
+    for user_id in range(count):
+        grades.add(user_id, 5, ['ok', str(user_id)])
+    return grades
+
+
+def test_grades_are_posted_in_chunks():
+    client = StubClient()
+    results = batch(client, 7).post()
+    assert client.bulk_calls == [[0, 1, 2], [3, 4, 5], [6]]
+    assert results == {user_id: True for user_id in range(7)}
+    assert client.individual == []
+
+
+def test_chunk_size_one_posts_individually():
+    client = StubClient()
+    assert batch(client, 3, chunk_size=1).post() == {0: True, 1: True, 2: True}
+    assert client.bulk_calls == [] and client.individual == [0, 1, 2]
+
+
+def test_progress_is_polled_until_completed():
+    client = StubClient(progress_states=['queued', 'running', 'completed'])
+    assert batch(client, 3).post() == {0: True, 1: True, 2: True}
+    assert client.polls == 3
+    assert client.individual == []
+
+
+def test_progress_timeout_falls_back_to_unapplied_students():
+    client = StubClient(progress_states=['running'], applies=set())
+    results = batch(client, 3, progress_timeout=0.01).post()
+    assert results == {0: True, 1: True, 2: True}
+    assert client.individual == [0, 1, 2]
+
+
+def test_failed_chunk_skips_students_already_updated():
+    client = StubClient(progress_states=['failed'], applies={0, 2})
+    results = batch(client, 3).post()
+    assert results == {0: True, 1: True, 2: True}
+    assert client.individual == [1]
+
+
+def test_student_with_an_older_grade_is_reposted():
+    client = StubClient(progress_states=['failed'], applies=set())
+    client.canvas[0] = (2, 'an earlier attempt')
+    batch(client, 1).post()
+    assert client.individual == [0]
+    assert client.canvas[0] == (5, 'ok\n0')
+
+
+def test_whole_chunk_reposted_when_current_grades_unknown():
+    client = StubClient(progress_states=['failed'], applies={0, 1, 2}, current_grades=False)
+    batch(client, 3).post()
+    assert client.individual == [0, 1, 2]
+
+
+def test_rejected_bulk_request_falls_back():
+    client = StubClient()
+    client.bulk_update_grades = lambda course_id, assignment_id, grades: None
+    assert batch(client, 2).post() == {0: True, 1: True}
+    assert client.individual == [0, 1]
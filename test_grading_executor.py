@@ -0,0 +1,133 @@
+import os
+import signal
+import time
+
+import pytest
+
+import grading_executor
+from grading_executor import GradingExecutor
+from grading_scripts.simulation import SubmissionTooExpensive
+
+
+# Graders are registered in grading_executor._graders before the pool forks, so the
+# workers have them without importing anything
+def echo(submission):
+    return submission['id'], [f"graded {submission['id']}"]
+
+
+def slow_echo(submission):
+    # Later submissions finish first, so in-order results can't be an accident of timing
+    time.sleep(0.05 * (5 - submission['id']))
+    return echo(submission)
+
+
+def spin(submission):
+    while True:
+        pass
+
+
+def stuck(submission):
+    # Out of reach of the worker's alarm
+    signal.pthread_sigmask(signal.SIG_BLOCK, {signal.SIGALRM})
+    time.sleep(5)
+    return 5, []
+
+
+def crash(submission):
+    os._exit(1)
+
+
+def hog(submission):
+    memory = bytearray(4 << 30)
+    return len(memory), []
+
+
+def too_expensive(submission):
+    raise SubmissionTooExpensive()
+
+
+@pytest.fixture(autouse=True)
+def graders(monkeypatch):
+    for grader in (echo, slow_echo, spin, stuck, crash, hog, too_expensive):
+        monkeypatch.setitem(grading_executor._graders, grader.__name__, grader)
+    monkeypatch.setattr(grading_executor, 'CHILD_GRACE_SECONDS', 1)
+
+
+@pytest.fixture
+def make_executor():
+    executors = []
+
+    def make(**kwargs):
+        executor = GradingExecutor([], max_workers=2, **kwargs)
+        executors.append(executor)
+        return executor
+    yield make
+    for executor in executors:
+        executor.shutdown()
+
+
+def test_results_come_back_in_submission_order(make_executor):
+    executor = make_executor(timeout=10)
+    results = executor.grade('slow_echo', [{'id': i} for i in range(5)])
+    assert results == [(i, [f"graded {i}"]) for i in range(5)]
+    assert len(executor.durations) == 5
+
+
+def test_alarm_stops_a_slow_submission(make_executor):
+    executor = make_executor(timeout=1)
+    (score, comments), = executor.grade('spin', [{'id': 1}])
+    assert score == 0
+    assert comments[0].startswith("Submission too expensive to simulate: it took longer than 1 seconds")
+
+
+def test_hung_worker_is_retried_not_graded(make_executor):
+    executor = make_executor(timeout=1)
+    pool = executor.pool
+    job = executor.submit('stuck', {'id': 1})
+    assert executor.result({'id': 1}, job, wait_timeout=0.2) == (-1, ["Grading did not finish in time, will retry."])
+    assert executor.pool is not pool
+    assert executor.grade('echo', [{'id': 2}]) == [(2, ["graded 2"])]
+
+
+def test_pool_recovers_after_a_worker_dies(make_executor):
+    executor = make_executor(timeout=10)
+    (score, comments), = executor.grade('crash', [{'id': 1}])
+    assert score == -1 and comments[0].startswith("Grading worker died")
+    assert executor.grade('echo', [{'id': 2}, {'id': 3}]) == [(2, ["graded 2"]), (3, ["graded 3"])]
+
+
+def test_simulator_out_of_memory_is_too_expensive(make_executor):
+    executor = make_executor(timeout=10)
+    assert executor.grade('too_expensive', [{'id': 1}]) == [
+        (0, ["Submission too expensive to simulate: it ran out of memory. Please simplify the construction file and resubmit."])
+    ]
+
+
+needs_isolation = pytest.mark.skipif(grading_executor.resource is None or not hasattr(os, 'fork'),
+                                     reason="isolated grading needs resource and os.fork()")
+
+
+@needs_isolation
+def test_isolated_submission_over_memory_limit(make_executor):
+    executor = make_executor(timeout=10, memory_limit=256 << 20)
+    (score, comments), = executor.grade('hog', [{'id': 1}])
+    assert score == 0 and "it ran out of memory" in comments[0]
+    assert executor.grade('echo', [{'id': 2}]) == [(2, ["graded 2"])]
+
+
+@needs_isolation
+def test_isolated_submission_over_cpu_limit(make_executor):
+    executor = make_executor(timeout=10, cpu_limit=1)
+    (score, comments), = executor.grade('spin', [{'id': 1}])
+    assert score == 0 and "it needed more than 1 second of computation" in comments[0]
+
+
+@needs_isolation
+def test_isolated_submission_out_of_alarm_reach_is_killed(make_executor):
+    executor = make_executor(timeout=1, memory_limit=256 << 20)
+    started = time.monotonic()
+    (score, comments), = executor.grade('stuck', [{'id': 1}])
+    assert score == 0 and "it took longer than 1 seconds to grade" in comments[0]
+    # Killed after timeout + CHILD_GRACE_SECONDS, before it would have finished by itself
+    assert time.monotonic() - started < 4
+    assert executor.grade('echo', [{'id': 2}]) == [(2, ["graded 2"])]
@@ -0,0 +1,59 @@
+import grading_ledger
+from grading_ledger import GradingLedger, POSTED, FAILED, SUPERSEDED
+
+
+def submission(attempt, body='PCR a b c d', user_id=42):
+    return {'user_id': user_id, 'attempt': attempt, 'body': body}
+
+
+def test_posted_grade_is_recorded(tmp_path):
+    ledger = GradingLedger(str(tmp_path / 'ledger.sqlite3'))
+    ledger.record(7, [(submission(1), 5, ['ok'], True)])
+    assert ledger.status(7, submission(1)) == POSTED
+    assert ledger.posted_grade(7, submission(1)) == (5, ['ok'])
+    # Same attempt with different content is a different row
+    assert ledger.status(7, submission(1, body='edited')) is None
+
+
+def test_new_attempt_supersedes_failed_post(tmp_path):
+    ledger = GradingLedger(str(tmp_path / 'ledger.sqlite3'))
+    ledger.record(7, [(submission(1), 2, ['old'], False)])
+    assert ledger.status(7, submission(1)) == FAILED
+
+    ledger.record(7, [(submission(2, body='new'), 5, ['new'], True)])
+    assert ledger.status(7, submission(1)) == SUPERSEDED
+    assert ledger.status(7, submission(2, body='new')) == POSTED
+
+
+def test_failed_retries_back_off_then_post(tmp_path, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(grading_ledger.time, 'time', lambda: now[0])
+    ledger = GradingLedger(str(tmp_path / 'ledger.sqlite3'))
+    ledger.record(7, [(submission(1), 3, ['retry me'], False)])
+    assert ledger.due_retries(7) == []
+
+    delays = []
+    for _ in range(3):
+        due_at = ledger.db.execute("SELECT next_retry_at FROM grades").fetchone()[0]
+        delays.append(due_at - now[0])
+        now[0] = due_at
+        (user_id, attempt, digest, score, comments), = ledger.due_retries(7)
+        assert (user_id, attempt, score, comments) == (42, 1, 3, ['retry me'])
+        ledger.record_retries(7, [(user_id, attempt, digest, False)])
+    assert delays == [60.0, 120.0, 240.0]
+
+    now[0] += 480.0
+    (user_id, attempt, digest, _, _), = ledger.due_retries(7)
+    ledger.record_retries(7, [(user_id, attempt, digest, True)])
+    assert ledger.status(7, submission(1)) == POSTED
+    assert ledger.due_retries(7) == []
+
+
+def test_retry_delay_is_capped(tmp_path, monkeypatch):
+    monkeypatch.setattr(grading_ledger.time, 'time', lambda: 0.0)
+    ledger = GradingLedger(str(tmp_path / 'ledger.sqlite3'))
+    ledger.record(7, [(submission(1), 3, [], False)])
+    digest = grading_ledger.content_hash(submission(1))
+    for _ in range(10):
+        ledger.record_retries(7, [(42, 1, digest, False)])
+    assert ledger.db.execute("SELECT next_retry_at FROM grades").fetchone()[0] == grading_ledger.RETRY_MAX_DELAY
@@ -0,0 +1,98 @@
+import time
+
+from pipeline import AssignmentPipeline
+
+ASSIGNMENT = {'id': 7, 'name': 'Design1', 'grader': 'grade_design1'}
+
+
+class StubExecutor:
+    max_workers = 1
+    timeout = 1
+
+    def submit(self, module_name, submission):
+        return submission['id']
+
+    def result(self, submission, job, wait_timeout=None):
+        return 5, [f"graded {job}"]
+
+
+class StubStore:
+    def __init__(self):
+        self.processed = set()
+        self.advanced = None
+        self.saved = False
+
+    def is_processed(self, assignment_id, submission):
+        return submission['id'] in self.processed
+
+    def mark_processed(self, assignment_id, submission):
+        self.processed.add(submission['id'])
+
+    def advance(self, assignment_id, submissions):
+        self.advanced = [s['id'] for s in submissions]
+
+    def save(self):
+        self.saved = True
+
+
+class StubLedger:
+    def __init__(self):
+        self.recorded = []
+
+    def status(self, assignment_id, submission):
+        return None
+
+    def record(self, assignment_id, rows):
+        self.recorded.extend(submission['id'] for submission, _, _, _ in rows)
+
+
+def pages(count):
+    for i in range(count):
+        yield [{'id': i, 'user_id': 100 + i, 'workflow_state': 'submitted', 'submitted_at': f'2026-03-01T00:00:{i:02d}Z'}]
+
+
+def test_complete_pass_advances_the_cursor():
+    store, ledger = StubStore(), StubLedger()
+    posted = []
+
+    def post_grades(grades):
+        posted.extend(user_id for user_id, _, _ in grades)
+        return {user_id: True for user_id, _, _ in grades}
+
+    pipeline = AssignmentPipeline(ASSIGNMENT, pages(5), store, ledger, StubExecutor(), post_grades, depth=1)
+    assert pipeline.run() == 5
+    assert sorted(posted) == [100, 101, 102, 103, 104]
+    assert store.processed == {0, 1, 2, 3, 4}
+    assert store.advanced == [0, 1, 2, 3, 4]
+    assert store.saved
+
+
+def test_failed_fetch_leaves_the_cursor():
+    def failing_pages():
+        yield from pages(2)
+        raise ConnectionError("page 3")
+
+    store = StubStore()
+    pipeline = AssignmentPipeline(ASSIGNMENT, failing_pages(), store, StubLedger(), StubExecutor(),
+                                  lambda grades: {user_id: True for user_id, _, _ in grades}, depth=1)
+    pipeline.run()
+    assert store.advanced is None
+    assert store.saved
+
+
+def test_stopped_pass_leaves_the_cursor():
+    def slow_pages():
+        # Grading waits for every page, so it is waiting when posting fails
+        for page in pages(50):
+            time.sleep(0.01)
+            yield page
+
+    def post_grades(grades):
+        raise RuntimeError("Canvas is down")
+
+    store = StubStore()
+    pipeline = AssignmentPipeline(ASSIGNMENT, slow_pages(), store, StubLedger(), StubExecutor(), post_grades, depth=1)
+    assert pipeline.run() < 50
+    assert not pipeline.listed_all
+    assert store.advanced is None
+    assert store.saved
@@ -0,0 +1,51 @@
+import gzip
+import json
+
+import pytest
+
+from grading_ledger import GradingLedger
+from replay import compare, previous_grade, read_snapshot, write_snapshot
+
+SUBMISSION = {'id': 1, 'user_id': 42, 'attempt': 1, 'body': '<p>PCR a b c d</p>'}
+
+
+def test_snapshot_round_trip(tmp_path):
+    path = str(tmp_path / 'snapshots' / '7.jsonl.gz')
+    submissions = [dict(SUBMISSION, previous={'score': 5, 'comments': ['ok'], 'source': 'ledger'}),
+                   dict(SUBMISSION, id=2, user_id=43, previous=None)]
+    assert write_snapshot(path, {'assignment_id': 7, 'grader': 'grade_design1'}, iter(submissions)) == 2
+    header, read = read_snapshot(path)
+    assert header == {'assignment_id': 7, 'grader': 'grade_design1', 'snapshot': 1}
+    assert read == submissions
+    assert not (tmp_path / 'snapshots' / '7.jsonl.gz.tmp').exists()
+
+
+def test_unknown_snapshot_format_is_rejected(tmp_path):
+    path = str(tmp_path / 'old.jsonl.gz')
+    with gzip.open(path, 'wt') as f:
+        f.write(json.dumps({'assignment_id': 7}) + '\n')
+    with pytest.raises(ValueError, match="not a snapshot"):
+        read_snapshot(path)
+
+
+def test_previous_grade_prefers_the_ledger(tmp_path):
+    ledger = GradingLedger(str(tmp_path / 'ledger.sqlite3'))
+    ledger.record(7, [(SUBMISSION, 5, ['PCR ok', 'Ligation ok'], True)])
+    canvas = dict(SUBMISSION, score=5.0, submission_comments=[{'comment': 'old'}, {'comment': 'PCR ok\nLigation ok'}])
+    assert previous_grade(canvas, ledger, 7) == {'score': 5, 'comments': ['PCR ok', 'Ligation ok'], 'source': 'ledger'}
+    assert previous_grade(canvas, None, 7) == {'score': 5.0, 'comments': ['PCR ok', 'Ligation ok'], 'source': 'canvas'}
+    assert previous_grade(SUBMISSION, None, 7) is None
+
+
+def test_compare():
+    submission = dict(SUBMISSION, previous={'score': 5.0, 'comments': ['PCR ok', 'Ligation ok'], 'source': 'canvas'})
+    assert compare(submission, 5, ['PCR ok', 'Ligation ok']) is None
+    assert compare(dict(SUBMISSION, previous=None), 3, ['x']) == {'change': 'new', 'score': 3}
+
+    changed = compare(submission, 5, ['PCR ok', 'Ligation failed'])
+    assert changed['change'] == 'comments'
+    assert changed['comment_diff'] == ['--- posted', '+++ regraded', '@@ -2 +2 @@', '-Ligation ok', '+Ligation failed']
+
+    changed = compare(submission, 3, ['PCR ok', 'Ligation ok'])
+    assert (changed['change'], changed['previous_score'], changed['score']) == ('score', 5.0, 3)
+    assert changed['comment_diff'] == []
@@ -0,0 +1,77 @@
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+import scheduler
+from scheduler import AssignmentSchedule, Scheduler, base_interval
+
+NOW = datetime(2026, 3, 2, 12, 0, tzinfo=timezone.utc)
+
+
+def dates(due=None, lock=None):
+    def iso(offset):
+        return (NOW + offset).strftime('%Y-%m-%dT%H:%M:%SZ') if offset is not None else None
+    return {'due_at': iso(due), 'lock_at': iso(lock)}
+
+
+def test_base_interval_follows_the_dates():
+    assert base_interval({}, NOW) == scheduler.DEFAULT_INTERVAL
+    assert base_interval(dates(due=timedelta(days=5)), NOW) == scheduler.DEFAULT_INTERVAL
+    assert base_interval(dates(due=timedelta(hours=10)), NOW) == scheduler.DEFAULT_INTERVAL // 2
+    assert base_interval(dates(due=timedelta(hours=1)), NOW) == scheduler.MIN_INTERVAL
+    assert base_interval(dates(due=-timedelta(hours=1)), NOW) == scheduler.MIN_INTERVAL
+    assert base_interval(dates(due=-timedelta(hours=12)), NOW) == scheduler.DEFAULT_INTERVAL
+    assert base_interval(dates(due=-timedelta(days=3)), NOW) == scheduler.LATE_INTERVAL
+    assert base_interval(dates(due=-timedelta(days=5), lock=-timedelta(days=3)), NOW) == scheduler.IDLE_INTERVAL
+    assert base_interval({'due_at': 'not a date'}, NOW) == scheduler.DEFAULT_INTERVAL
+
+
+def test_interval_halves_with_submissions_and_backs_off_without():
+    schedule = AssignmentSchedule({'id': 1, 'name': 'A'})
+    intervals = []
+    for new_submissions in (3, 3, 3, 3, 0, 0, 0, 0, 0, 0):
+        schedule.update(new_submissions, now=100.0)
+        intervals.append(schedule.interval)
+    assert intervals == [150, 75, 37.5, 30, 45, 67.5, 101.25, 151.875, 227.8125, 300]
+    assert schedule.next_run_at == 100.0 + 300
+
+
+def test_interval_never_exceeds_the_date_based_one():
+    schedule = AssignmentSchedule({'id': 1, 'name': 'A'})
+    schedule.info = dates(due=datetime.now(timezone.utc) - NOW + timedelta(minutes=30))
+    schedule.update(0, now=0.0)
+    assert schedule.interval == scheduler.MIN_INTERVAL
+
+
+def test_trigger_while_running_runs_again():
+    started = threading.Event()
+    release = threading.Event()
+    runs = []
+
+    def run_assignment(assignment):
+        runs.append(assignment['id'])
+        if len(runs) == 1:
+            started.set()
+            release.wait(5)
+        return 0
+
+    assignments = [{'id': 1, 'name': 'A'}, {'id': 2, 'name': 'B'}]
+    jobs = Scheduler(assignments, run_assignment)
+    jobs.schedules[1].next_run_at = time.monotonic() + 3600  # only A runs
+    loop = threading.Thread(target=jobs.run_forever)
+    loop.start()
+    try:
+        assert started.wait(5)
+        assert jobs.trigger(1)
+        assert not jobs.trigger(3)
+        release.set()
+        for _ in range(100):
+            if len(runs) == 2:
+                break
+            time.sleep(0.05)
+        assert runs == [1, 1]
+    finally:
+        release.set()
+        jobs.stop()
+        loop.join(5)
+    assert not jobs.schedules[0].rerun
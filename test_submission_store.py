@@ -0,0 +1,54 @@
+from submission_store import SubmissionCursorStore
+
+
+def submission(submission_id, submitted_at):
+    return {'id': submission_id, 'user_id': submission_id + 1000, 'submitted_at': submitted_at}
+
+
+def test_cursor_holds_at_oldest_pending_then_advances(tmp_path):
+    store = SubmissionCursorStore(str(tmp_path / 'cursors.json'))
+    first = submission(1, '2024-02-01T10:00:00Z')
+    second = submission(2, '2024-02-01T11:00:00Z')
+    store.mark_processed(7, second)
+
+    store.advance(7, [first, second])
+    assert store.state['7']['cursor'] == first['submitted_at']
+    assert store.get_since(7) == '2024-02-01T09:55:00Z'
+
+    store.mark_processed(7, first)
+    store.advance(7, [first, second])
+    assert store.state['7']['cursor'] == second['submitted_at']
+
+
+def test_resubmission_is_not_processed(tmp_path):
+    store = SubmissionCursorStore(str(tmp_path / 'cursors.json'))
+    store.mark_processed(7, submission(1, '2024-02-01T10:00:00Z'))
+    assert store.is_processed(7, submission(1, '2024-02-01T10:00:00Z'))
+    assert not store.is_processed(7, submission(1, '2024-02-01T12:00:00Z'))
+
+
+def test_processed_pruned_before_fetch_window_and_saved(tmp_path):
+    path = str(tmp_path / 'cursors.json')
+    store = SubmissionCursorStore(path)
+    old = submission(1, '2024-02-01T10:00:00Z')
+    recent = submission(2, '2024-02-01T11:58:00Z')
+    newest = submission(3, '2024-02-01T12:00:00Z')
+    for s in (old, recent, newest):
+        store.mark_processed(7, s)
+
+    store.advance(7, [old, recent, newest])
+    assert set(store.state['7']['processed']) == {'2', '3'}  # 1 is older than cursor - overlap
+
+    store.save()
+    reloaded = SubmissionCursorStore(path)
+    assert reloaded.state == store.state
+    assert reloaded.is_processed(7, newest)
+
+
+def test_cursor_never_moves_back_without_pending(tmp_path):
+    store = SubmissionCursorStore(str(tmp_path / 'cursors.json'))
+    newest = submission(3, '2024-02-01T12:00:00Z')
+    store.mark_processed(7, newest)
+    store.advance(7, [newest])
+    store.advance(7, [])
+    assert store.state['7']['cursor'] == newest['submitted_at']